@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import logging
+import time
+from decimal import Decimal
+
+from src.database.manager import db_manager
+from src.database.memory import MemoryBackend
+from src.handlers.profile import get_user_profile_data
+from src.logic import admin_logic
+from src.logic.qr_logic import issue_temporary_code
+
+ADMIN_ID = 1
+USER_ID_OFFSET = 100_000
+
+
+async def issue_code(user_id: int) -> str | None:
+    issued = await issue_temporary_code(user_id)
+    return issued['secret_code'] if issued else None
+
+
+async def checkout(user_id: int, token: str):
+    token_info = await admin_logic.resolve_token(token)
+    if token_info is None:
+        raise RuntimeError(f"Token {token} did not validate")
+    return await admin_logic.finalize_user_update(
+        client_user_id=user_id,
+        used_token=token,
+        entered_amount=Decimal('450.00'),
+        hookah_count_added=1,
+        used_free_hookahs=0,
+        admin_id=ADMIN_ID,
+        admin_name='bench',
+        admin_username=None
+    )
+
+
+async def run_stage(name: str, iterations: int, concurrency: int, operation):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index: int):
+        async with semaphore:
+            return await operation(index)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(bounded(index) for index in range(iterations)))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<18} {iterations:>8} ops  {iterations / elapsed:>10.0f} ops/s  {elapsed / iterations * 1e6:>9.1f} us/op")
+    return results
+
+
+async def main(iterations: int, users: int, concurrency: int):
+    await db_manager.use_backend(MemoryBackend())
+    await db_manager.connect()
+
+    user_ids = [USER_ID_OFFSET + index % users for index in range(iterations)]
+    tokens = await run_stage(
+        "issue_code", iterations, concurrency, lambda index: issue_code(user_ids[index]))
+    await run_stage(
+        "resolve_token", iterations, concurrency, lambda index: admin_logic.resolve_token(tokens[index]))
+    live_tokens = list(dict(zip(user_ids, tokens)).items())
+    await run_stage(
+        "checkout", len(live_tokens), concurrency, lambda index: checkout(*live_tokens[index]))
+    await run_stage(
+        "profile", iterations, concurrency, lambda index: get_user_profile_data(user_ids[index]))
+    await run_stage(
+        "clients_report", max(1, iterations // 1000), 1, lambda index: admin_logic.generate_clients_report_csv())
+
+    print()
+    print(f"{'query':<28} {'count':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for stats in db_manager.get_query_stats(limit=10):
+        print(f"{stats['fingerprint'][:28]:<28} {stats['count']:>8} {stats['p50_ms']:>8} {stats['p99_ms']:>8}")
+    print(f"\npool: {db_manager.get_pool_stats()}")
+    await db_manager.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run logic-layer benchmarks against the in-memory database backend.")
+    parser.add_argument('--iterations', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    arguments = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(main(arguments.iterations, arguments.users, arguments.concurrency))
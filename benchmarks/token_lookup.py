@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+import asyncpg
+
+from src.config import settings
+from src.database import queries
+from src.database.metrics import _percentile
+
+BENCH_TABLE = 'temporary_codes'
+BENCH_USERS = 5000
+
+CREATE_USERS_SQL = """
+CREATE TEMP TABLE users (
+    user_id BIGINT PRIMARY KEY,
+    name VARCHAR(255),
+    phone_number VARCHAR(30),
+    free_hookahs_available INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+FILL_USERS_SQL = """
+INSERT INTO users (user_id, name, phone_number, free_hookahs_available)
+SELECT 100000 + i, 'Guest ' || i, '+380' || lpad(i::text, 9, '0'), i % 3
+FROM generate_series(0, $1::int - 1) AS i;
+"""
+
+CREATE_TABLE_SQL = f"""
+CREATE TEMP TABLE {BENCH_TABLE} (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL REFERENCES users(user_id),
+    secret_code VARCHAR(10) NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    message_id BIGINT NULL
+);
+"""
+
+FILL_SQL = f"""
+INSERT INTO {BENCH_TABLE} (user_id, secret_code, expires_at)
+SELECT 100000 + i % {BENCH_USERS}, upper(lpad(to_hex(i), 6, '0')), now() + make_interval(secs => (i % 1200) - 600)
+FROM generate_series($1::int, $2::int) AS i;
+"""
+
+
+async def measure(conn, table_size: int, lookups: int) -> tuple[float, float, float]:
+    statement = await conn.prepare(queries.RESOLVE_TOKEN.sql)
+    samples = []
+    for _ in range(lookups):
+        code = f"{random.randint(0, table_size * 2):06X}"
+        started = time.perf_counter()
+        await statement.fetchrow(code, datetime.now(timezone.utc))
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return _percentile(samples, 50) * 1000, _percentile(samples, 99) * 1000, samples[-1] * 1000
+
+
+async def main(dsn: str | None, sizes: list[int], lookups: int):
+    if dsn:
+        conn = await asyncpg.connect(dsn=dsn)
+    else:
+        conn = await asyncpg.connect(
+            host=settings.db_host, port=settings.db_port, user=settings.db_user,
+            password=settings.db_password, database=settings.db_name)
+    try:
+        await conn.execute(CREATE_USERS_SQL)
+        await conn.execute(FILL_USERS_SQL, BENCH_USERS)
+        await conn.execute(CREATE_TABLE_SQL)
+        print(f"{'rows':>10} {'index':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        filled = 0
+        for size in sorted(sizes):
+            await conn.execute(f"DROP INDEX IF EXISTS {BENCH_TABLE}_secret_code;")
+            await conn.execute(f"DROP INDEX IF EXISTS {BENCH_TABLE}_secret_code_covering;")
+            await conn.execute(FILL_SQL, filled + 1, size)
+            filled = size
+            await conn.execute(f"ANALYZE {BENCH_TABLE};")
+            p50, p99, worst = await measure(conn, size, lookups)
+            print(f"{size:>10} {'none':>8} {p50:>8.3f} {p99:>8.3f} {worst:>8.3f}")
+
+            await conn.execute(f"CREATE UNIQUE INDEX {BENCH_TABLE}_secret_code ON {BENCH_TABLE} (secret_code);")
+            await conn.execute(f"ANALYZE {BENCH_TABLE};")
+            p50, p99, worst = await measure(conn, size, lookups)
+            print(f"{size:>10} {'unique':>8} {p50:>8.3f} {p99:>8.3f} {worst:>8.3f}")
+
+            await conn.execute(f"DROP INDEX {BENCH_TABLE}_secret_code;")
+            await conn.execute(
+                f"CREATE UNIQUE INDEX {BENCH_TABLE}_secret_code_covering ON {BENCH_TABLE} (secret_code) "
+                f"INCLUDE (user_id, expires_at);")
+            await conn.execute(f"VACUUM ANALYZE {BENCH_TABLE};")
+            p50, p99, worst = await measure(conn, size, lookups)
+            print(f"{size:>10} {'covering':>8} {p50:>8.3f} {p99:>8.3f} {worst:>8.3f}")
+    finally:
+        await conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Measure RESOLVE_TOKEN latency against temporary_codes with no index, a unique index and a covering index.")
+    parser.add_argument('--dsn', default=None, help="Postgres DSN; defaults to the [Database] settings.")
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--lookups', type=int, default=2000)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.dsn, [int(size) for size in arguments.sizes.split(',')], arguments.lookups))
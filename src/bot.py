@@ -9,10 +9,14 @@ from aiogram.types import BotCommand, BotCommandScopeDefault, BotCommandScopeCha
 from src.config import settings
 from src.database.backup import create_db_backup
 from src.handlers import registration, main_menu, qr_handler, admin_main, admin_reports, admin_broadcasts, \
-    admin_token_flow, profile, instruction, booking, waiters_report, serviced_clients_report
+    admin_token_flow, profile, instruction, booking, waiters_report, serviced_clients_report, admin_diagnostics
 from src.database.manager import db_manager
+from src.logic.broadcast_jobs import broadcast_jobs
+from src.logic.code_expiry import code_expiry
+from src.logic.code_messages import code_message_writer
+from src.logic.code_pool import code_pool
 from src.utils.messages import get_message
-from src.utils.tg_utils import safe_delete_message
+from src.utils.qr_generator import qr_render_pool
 
 logging.basicConfig(level=logging.INFO)
 
@@ -78,54 +82,13 @@ async def set_bot_commands(bot: Bot):
          logger.warning("No admin IDs configured. Admin commands will not be set.")
 
 async def cleanup_expired_codes(bot: Bot):
-    now_utc = datetime.now(timezone.utc)
-    deleted_messages = 0
-    failed_message_deletions = 0
-
-    sql_delete_expired_returning = """
-    DELETE FROM temporary_codes
-    WHERE expires_at < $1
-    RETURNING user_id, message_id;
-    """
-
-    try:
-        deleted_records = await db_manager.fetch_all(sql_delete_expired_returning, now_utc)
-
-        if not deleted_records:
-            logger.info("Cleanup: No expired codes found to delete.")
-            return
-
-        deleted_count = len(deleted_records)
-        logger.info(f"Cleanup: Deleted {deleted_count} expired code records from the database.")
-
-        for record in deleted_records:
-            user_id = record.get('user_id')
-            message_id = record.get('message_id')
-
-            if not user_id:
-                logger.warning(f"Cleanup: Skipping record with missing user_id: {record}")
-                continue
-
-            if message_id:
-                try:
-                    await safe_delete_message(bot, chat_id=user_id, message_id=message_id)
-                    deleted_messages += 1
-                except Exception:
-                    logger.warning(f"Cleanup: Failed attempt to delete message {message_id} for user {user_id}. Error logged by safe_delete_message.")
-                    failed_message_deletions += 1
-
-        log_summary = f"Cleanup finished: DB records deleted: {deleted_count}."
-        if deleted_messages > 0 or failed_message_deletions > 0:
-            log_summary += f" TG messages deleted: {deleted_messages}, Failed TG deletions: {failed_message_deletions}."
-        logger.info(log_summary)
-
-    except Exception as e:
-        logger.error(f"Cleanup: Database error during expired code deletion: {e}", exc_info=True)
+    await code_message_writer.flush()
+    await code_expiry.sweep(bot)
 
 
 async def schedule_cleanup(bot: Bot):
     interval = settings.cleanup_interval_seconds
-    logger.info(f"Starting background cleanup task. Interval: {interval} seconds.")
+    logger.info(f"Starting fallback cleanup sweep. Interval: {interval} seconds.")
     while True:
         try:
             await cleanup_expired_codes(bot)
@@ -149,6 +112,10 @@ async def on_startup(bot: Bot):
         if backup_task is None:
             backup_task = asyncio.create_task(schedule_daily_backup())
             logger.info("Background daily backup task scheduled.")
+        code_pool.start()
+        code_message_writer.start()
+        await code_expiry.start(bot)
+        await broadcast_jobs.resume_all(bot)
 
     except Exception as e:
          logger.critical(f"Startup failed: Could not connect to DB or set commands. Error: {e}", exc_info=True)
@@ -175,6 +142,12 @@ async def on_shutdown():
         except Exception as e:
             logger.error(f"Error during cleanup task cancellation: {e}", exc_info=True)
 
+    await broadcast_jobs.stop()
+    await code_expiry.stop()
+    await code_pool.stop()
+    qr_render_pool.shutdown()
+    await code_message_writer.stop()
+
     await db_manager.close()
     logger.info("Database connection pool closed.")
 
@@ -202,6 +175,7 @@ async def main():
     dp.include_router(booking.router)
     dp.include_router(waiters_report.router)
     dp.include_router(serviced_clients_report.router)
+    dp.include_router(admin_diagnostics.router)
 
     logging.info("Запуск бота...")
     await dp.start_polling(bot)
@@ -22,8 +22,14 @@ class Settings:
     def _load_settings(self):
         self._load_telegram_settings()
         self._load_database_settings()
+        self._load_database_pool_settings()
+        self._load_database_replica_settings()
+        self._load_database_monitoring_settings()
+        self._load_database_resilience_settings()
         self._load_admin_settings()
         self._load_business_logic_settings()
+        self._load_qr_settings()
+        self._load_broadcast_settings()
 
     def _load_telegram_settings(self):
         try:
@@ -47,6 +53,65 @@ class Settings:
             self.db_password = None
             self.db_name = None
 
+    def _load_database_pool_settings(self):
+        try:
+            self.db_pool_min_size = self.config.getint('Database', 'POOL_MIN_SIZE', fallback=2)
+            self.db_pool_max_size = self.config.getint('Database', 'POOL_MAX_SIZE', fallback=10)
+            self.db_pool_max_inactive_connection_lifetime = self.config.getfloat(
+                'Database', 'POOL_MAX_INACTIVE_CONNECTION_LIFETIME', fallback=300.0)
+            self.db_pool_acquire_timeout = self.config.getfloat('Database', 'POOL_ACQUIRE_TIMEOUT', fallback=10.0)
+            self.db_statement_cache_size = self.config.getint('Database', 'STATEMENT_CACHE_SIZE', fallback=100)
+            self.db_command_timeout = self.config.getfloat('Database', 'COMMAND_TIMEOUT', fallback=30.0)
+        except Exception as e:
+            logging.error(f"Error loading database pool settings: {e}", exc_info=True)
+            self.db_pool_min_size = 2
+            self.db_pool_max_size = 10
+            self.db_pool_max_inactive_connection_lifetime = 300.0
+            self.db_pool_acquire_timeout = 10.0
+            self.db_statement_cache_size = 100
+            self.db_command_timeout = 30.0
+
+    def _load_database_replica_settings(self):
+        try:
+            replica_dsns_str = self.config.get('Database', 'REPLICA_DSNS', fallback='')
+            self.db_replica_dsns = [dsn.strip() for dsn in replica_dsns_str.split(',') if dsn.strip()]
+            self.db_replica_max_lag_seconds = self.config.getfloat('Database', 'REPLICA_MAX_LAG_SECONDS', fallback=5.0)
+            self.db_replica_lag_check_interval = self.config.getfloat('Database', 'REPLICA_LAG_CHECK_INTERVAL', fallback=5.0)
+            if self.db_replica_dsns:
+                logging.info(f"Loaded {len(self.db_replica_dsns)} read replica DSN(s).")
+        except Exception as e:
+            logging.error(f"Error loading read replica settings: {e}", exc_info=True)
+            self.db_replica_dsns = []
+            self.db_replica_max_lag_seconds = 5.0
+            self.db_replica_lag_check_interval = 5.0
+
+    def _load_database_monitoring_settings(self):
+        try:
+            self.db_slow_query_threshold_ms = self.config.getfloat('Database', 'SLOW_QUERY_THRESHOLD_MS', fallback=200.0)
+            self.db_slow_query_log_size = self.config.getint('Database', 'SLOW_QUERY_LOG_SIZE', fallback=50)
+            self.db_slow_query_explain_sample_rate = self.config.getfloat(
+                'Database', 'SLOW_QUERY_EXPLAIN_SAMPLE_RATE', fallback=0.0)
+        except Exception as e:
+            logging.error(f"Error loading database monitoring settings: {e}", exc_info=True)
+            self.db_slow_query_threshold_ms = 200.0
+            self.db_slow_query_log_size = 50
+            self.db_slow_query_explain_sample_rate = 0.0
+
+    def _load_database_resilience_settings(self):
+        try:
+            self.db_retry_attempts = self.config.getint('Database', 'RETRY_ATTEMPTS', fallback=3)
+            self.db_retry_base_delay = self.config.getfloat('Database', 'RETRY_BASE_DELAY', fallback=0.1)
+            self.db_retry_max_delay = self.config.getfloat('Database', 'RETRY_MAX_DELAY', fallback=2.0)
+            self.db_breaker_failure_threshold = self.config.getint('Database', 'BREAKER_FAILURE_THRESHOLD', fallback=5)
+            self.db_breaker_reset_timeout = self.config.getfloat('Database', 'BREAKER_RESET_TIMEOUT', fallback=30.0)
+        except Exception as e:
+            logging.error(f"Error loading database resilience settings: {e}", exc_info=True)
+            self.db_retry_attempts = 3
+            self.db_retry_base_delay = 0.1
+            self.db_retry_max_delay = 2.0
+            self.db_breaker_failure_threshold = 5
+            self.db_breaker_reset_timeout = 30.0
+
     def _load_admin_settings(self):
         try:
             admin_ids_str = self.config.get('Admin', 'ADMIN_IDS', fallback='')
@@ -78,7 +143,16 @@ class Settings:
         try:
             self.free_hookah_every = self.config.getint('BusinessLogic', 'FREE_HOOKAH_EVERY',fallback=6)
             self.qr_code_ttl_seconds = self.config.getint('BusinessLogic', 'QR_CODE_TTL_SECONDS',fallback=600)
+            self.qr_reuse_policy = self.config.get('BusinessLogic', 'QR_REUSE_POLICY', fallback='reuse').strip().lower()
+            self.qr_reuse_min_ttl_seconds = self.config.getint('BusinessLogic', 'QR_REUSE_MIN_TTL_SECONDS', fallback=180)
             self.cleanup_interval_seconds = self.config.getint('BusinessLogic', 'CLEANUP_INTERVAL_SECONDS',fallback=610)
+            self.expiry_batch_size = self.config.getint('BusinessLogic', 'EXPIRY_BATCH_SIZE', fallback=50)
+            self.expiry_batch_interval_ms = self.config.getint('BusinessLogic', 'EXPIRY_BATCH_INTERVAL_MS', fallback=100)
+            self.token_cache_max_entries = self.config.getint('BusinessLogic', 'TOKEN_CACHE_MAX_ENTRIES', fallback=10000)
+            self.cleanup_batch_size = self.config.getint('BusinessLogic', 'CLEANUP_BATCH_SIZE', fallback=500)
+            self.message_delete_rate_per_second = self.config.getfloat(
+                'BusinessLogic', 'MESSAGE_DELETE_RATE_PER_SECOND', fallback=20.0)
+            self.message_delete_concurrency = self.config.getint('BusinessLogic', 'MESSAGE_DELETE_CONCURRENCY', fallback=8)
             self.menu_url = self.config.get("BusinessLogic", "MENU_URL", fallback=None)
             self.booking_phone_number = self.config.get("BusinessLogic", "BOOKING_PHONE_NUMBER", fallback=None)
             self.instagram_url = self.config.get("BusinessLogic", "INSTAGRAM_URL", fallback=None)
@@ -86,5 +160,50 @@ class Settings:
         except Exception as e:
             logging.error(f"Error loading buisness logic settings: {e}", exc_info=True)
 
+    def _load_qr_settings(self):
+        try:
+            self.qr_render_workers = self.config.getint('QR', 'RENDER_WORKERS', fallback=2)
+            self.qr_render_queue_size = self.config.getint('QR', 'RENDER_QUEUE_SIZE', fallback=32)
+            self.qr_encoder = self.config.get('QR', 'ENCODER', fallback='compact').strip().lower()
+            self.qr_error_correction = self.config.get('QR', 'ERROR_CORRECTION', fallback='L').strip().upper()
+            self.qr_box_size = self.config.getint('QR', 'BOX_SIZE', fallback=8)
+            self.qr_border = self.config.getint('QR', 'BORDER', fallback=4)
+            self.qr_pool_low_watermark = self.config.getint('QR', 'POOL_LOW_WATERMARK', fallback=20)
+            self.qr_pool_high_watermark = self.config.getint('QR', 'POOL_HIGH_WATERMARK', fallback=100)
+            self.qr_pool_refill_rate = self.config.getfloat('QR', 'POOL_REFILL_RATE', fallback=50.0)
+            self.qr_message_id_flush_interval_ms = self.config.getint(
+                'QR', 'MESSAGE_ID_FLUSH_INTERVAL_MS', fallback=250)
+            self.qr_message_id_flush_batch = self.config.getint('QR', 'MESSAGE_ID_FLUSH_BATCH', fallback=100)
+        except Exception as e:
+            logging.error(f"Error loading QR settings: {e}", exc_info=True)
+            self.qr_render_workers = 2
+            self.qr_render_queue_size = 32
+            self.qr_encoder = 'compact'
+            self.qr_error_correction = 'L'
+            self.qr_box_size = 8
+            self.qr_border = 4
+            self.qr_pool_low_watermark = 20
+            self.qr_pool_high_watermark = 100
+            self.qr_pool_refill_rate = 50.0
+            self.qr_message_id_flush_interval_ms = 250
+            self.qr_message_id_flush_batch = 100
+
+    def _load_broadcast_settings(self):
+        try:
+            self.broadcast_concurrency = self.config.getint('Broadcast', 'CONCURRENCY', fallback=8)
+            self.broadcast_rate_per_second = self.config.getfloat('Broadcast', 'RATE_PER_SECOND', fallback=25.0)
+            self.broadcast_batch_size = self.config.getint('Broadcast', 'BATCH_SIZE', fallback=200)
+            self.broadcast_report_interval_seconds = self.config.getfloat(
+                'Broadcast', 'REPORT_INTERVAL_SECONDS', fallback=5.0)
+            self.broadcast_progress_edit_interval_seconds = self.config.getfloat(
+                'Broadcast', 'PROGRESS_EDIT_INTERVAL_SECONDS', fallback=15.0)
+        except Exception as e:
+            logging.error(f"Error loading broadcast settings: {e}", exc_info=True)
+            self.broadcast_concurrency = 8
+            self.broadcast_rate_per_second = 25.0
+            self.broadcast_batch_size = 200
+            self.broadcast_report_interval_seconds = 5.0
+            self.broadcast_progress_edit_interval_seconds = 15.0
+
 settings = Settings()
 
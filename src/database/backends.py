@@ -0,0 +1,42 @@
+import logging
+
+import asyncpg
+
+from src.database.connection import RegistryConnection
+
+
+class PostgresBackend:
+    name = 'postgres'
+    supports_replicas = True
+
+    async def open(self, manager):
+        pool = None
+        try:
+            pool = await asyncpg.create_pool(
+                host=manager.host,
+                port=manager.port,
+                user=manager.user,
+                password=manager.password,
+                database=manager.database,
+                min_size=manager.min_pool_size,
+                max_size=manager.max_pool_size,
+                max_inactive_connection_lifetime=manager.max_inactive_connection_lifetime,
+                statement_cache_size=manager.statement_cache_size,
+                command_timeout=manager.command_timeout,
+                connection_class=RegistryConnection,
+                init=manager._init_connection
+            )
+            logging.info(
+                f"Successfully created connection pool for {manager.database} in {manager.host}:{manager.port} "
+                f"(min_size={manager.min_pool_size}, max_size={manager.max_pool_size})")
+
+            await manager._initialize_schema(pool)
+            logging.info("Database schema initialized successfully.")
+            manager._schema_ready = True
+
+            await manager._warm_up(pool)
+            return pool
+        except Exception:
+            if pool is not None:
+                pool.terminate()
+            raise
@@ -0,0 +1,91 @@
+import asyncpg
+from asyncpg.exceptions import InvalidCachedStatementError, FeatureNotSupportedError
+from asyncpg.prepared_stmt import PreparedStatement
+
+from src.database.queries import NamedQuery, QUERY_REGISTRY
+
+STALE_STATEMENT_ERRORS = (InvalidCachedStatementError, FeatureNotSupportedError)
+
+
+class RegistryConnection(asyncpg.Connection):
+    __slots__ = ('_prepared_queries',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prepared_queries = {}
+
+    async def prepare_registry(self):
+        for query in QUERY_REGISTRY.values():
+            await self.prepared(query)
+
+    async def prepared(self, query: NamedQuery):
+        statement = self._prepared_queries.get(query.name)
+        if statement is None:
+            statement = await self.prepare(query.sql)
+            self._prepared_queries[query.name] = statement
+        else:
+            # asyncpg invalidates statement handles on every pool release; the server-side statement survives.
+            released_at = getattr(statement, '_con_release_ctr', None)
+            release_ctr = getattr(self, '_pool_release_ctr', None)
+            state = getattr(statement, '_state', None)
+            if released_at is None or release_ctr is None or state is None:
+                statement = await self.prepare(query.sql)
+                self._prepared_queries[query.name] = statement
+            elif released_at != release_ctr:
+                statement = PreparedStatement(self, query.sql, state)
+                self._prepared_queries[query.name] = statement
+        return statement
+
+    async def _run_prepared(self, query: NamedQuery, method: str, args):
+        statement = await self.prepared(query)
+        try:
+            return await self._call_statement(statement, method, args)
+        except STALE_STATEMENT_ERRORS:
+            if self.is_in_transaction():
+                raise
+            self._prepared_queries.pop(query.name, None)
+            statement = await self.prepared(query)
+            return await self._call_statement(statement, method, args)
+
+    @staticmethod
+    async def _call_statement(statement, method: str, args):
+        if method == 'executemany':
+            return await statement.executemany(*args)
+        if method == 'execute':
+            await statement.fetch(*args)
+            return statement.get_statusmsg()
+        if method == 'fetchrow':
+            return await statement.fetchrow(*args)
+        if method == 'fetchval':
+            return await statement.fetchval(*args)
+        return await statement.fetch(*args)
+
+    async def execute(self, query, *args, **kwargs):
+        if isinstance(query, NamedQuery):
+            return await self._run_prepared(query, 'execute', args)
+        return await super().execute(query, *args, **kwargs)
+
+    async def fetch(self, query, *args, **kwargs):
+        if isinstance(query, NamedQuery):
+            return await self._run_prepared(query, 'fetch', args)
+        return await super().fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        if isinstance(query, NamedQuery):
+            return await self._run_prepared(query, 'fetchrow', args)
+        return await super().fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        if isinstance(query, NamedQuery):
+            return await self._run_prepared(query, 'fetchval', args)
+        return await super().fetchval(query, *args, **kwargs)
+
+    async def executemany(self, command, args, **kwargs):
+        if isinstance(command, NamedQuery):
+            return await self._run_prepared(command, 'executemany', (args,))
+        return await super().executemany(command, args, **kwargs)
+
+    def cursor(self, query, *args, **kwargs):
+        if isinstance(query, NamedQuery):
+            query = query.sql
+        return super().cursor(query, *args, **kwargs)
@@ -1,115 +1,190 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+
 import asyncpg
 from src.config import settings
-import logging
+from src.database.backends import PostgresBackend
+from src.database.connection import RegistryConnection
+from src.database.metrics import PoolMetrics, PoolStats, QueryMetrics, QueryStats, SlowQueryEntry, \
+    query_fingerprint, count_result_rows
+from src.database.migrations import apply_migrations
+from src.database.queries import NamedQuery
+from src.database.replicas import Replica, ReplicaStats, REPLICA_LAG_SQL, REPLICA_CONNECTION_ERRORS, \
+    REPLICA_CONNECT_TIMEOUT
+from src.database.unit_of_work import UnitOfWork
+from src.database.resilience import CircuitBreaker, RetryPolicy, BreakerStats, TRANSIENT_DB_ERRORS, \
+    BREAKER_FAILURE_ERRORS
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+EXPLAINABLE_QUERY_RE = re.compile(r"\s*SELECT\b", re.IGNORECASE)
+WRITE_KEYWORDS_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
 
-class DatabaseManager:
-    CREATE_USERS_TABLE_SQL = """
-    CREATE TABLE IF NOT EXISTS users (
-        user_id BIGINT PRIMARY KEY,
-        name VARCHAR(255),
-        phone_number VARCHAR(30),
-        registration_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
-        total_spent NUMERIC(10,2) NOT NULL DEFAULT 0.00,
-        hookah_count INTEGER NOT NULL DEFAULT 0,
-        free_hookahs_available INTEGER NOT NULL DEFAULT 0
-    );
-    """
-    CREATE_TEMP_CODES_TABLE_SQL = """
-    CREATE TABLE IF NOT EXISTS temporary_codes (
-        id SERIAL PRIMARY KEY,
-        user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
-        secret_code VARCHAR(10) NOT NULL,
-        expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
-        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
-        message_id BIGINT NULL
-    );
-    """
-    CREATE_TEMP_CODES_INDEX_SQL = """
-    CREATE INDEX IF NOT EXISTS idx_temporary_codes_expires_at ON temporary_codes (expires_at);
-    CREATE INDEX IF NOT EXISTS idx_temporary_codes_user_id_expires ON temporary_codes (user_id, expires_at);
-    """
-
-    CREATE_ADMIN_ACTIONS_TABLE_SQL = """
-    CREATE TABLE IF NOT EXISTS admin_actions (
-        id SERIAL PRIMARY KEY,
-        admin_id BIGINT NOT NULL,
-        admin_name TEXT,
-        admin_username TEXT,
-        action_type TEXT NOT NULL,
-        user_id BIGINT,
-        client_name TEXT,
-        client_phone_number TEXT,
-        amount NUMERIC(10,2),
-        hookah_count INTEGER,
-        action_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
-    );
-    """
-
-    CREATE_ADMIN_ACTIONS_INDEX_SQL = """
-    CREATE INDEX IF NOT EXISTS idx_admin_actions_admin_id ON admin_actions(admin_id);
-    CREATE INDEX IF NOT EXISTS idx_admin_actions_action_date ON admin_actions(action_date);
-    CREATE INDEX IF NOT EXISTS idx_admin_actions_user_id ON admin_actions(user_id); 
-    """
 
+class DatabaseManager:
     def __init__(self):
         self.host = settings.db_host
         self.port = settings.db_port
         self.user = settings.db_user
         self.password = settings.db_password
         self.database = settings.db_name
+        self.min_pool_size = settings.db_pool_min_size
+        self.max_pool_size = settings.db_pool_max_size
+        self.max_inactive_connection_lifetime = settings.db_pool_max_inactive_connection_lifetime
+        self.acquire_timeout = settings.db_pool_acquire_timeout or None
+        self.statement_cache_size = settings.db_statement_cache_size
+        self.command_timeout = settings.db_command_timeout or None
+        self.replica_max_lag_seconds = settings.db_replica_max_lag_seconds
+        self.replica_lag_check_interval = settings.db_replica_lag_check_interval
+        self._replicas = [Replica(dsn) for dsn in settings.db_replica_dsns]
+        self._next_replica = 0
+        self._replica_refresh_tasks = set()
+        self.backend = PostgresBackend()
         self._pool = None
+        self._schema_ready = False
+        self._connect_lock = asyncio.Lock()
+        self.pool_metrics = PoolMetrics()
+        self.query_metrics = QueryMetrics(settings.db_slow_query_threshold_ms, settings.db_slow_query_log_size)
+        self.explain_sample_rate = settings.db_slow_query_explain_sample_rate
+        self._explain_task = None
+        self.breaker = CircuitBreaker(settings.db_breaker_failure_threshold, settings.db_breaker_reset_timeout)
+        self.retry_policy = RetryPolicy(
+            settings.db_retry_attempts, settings.db_retry_base_delay, settings.db_retry_max_delay)
 
     async def _initialize_schema(self, pool):
         if not pool:
             logging.error("Cannot initialize schema, connection pool is not available.")
             return
         try:
-            async with pool.acquire() as conn:
-                async with conn.transaction():
-                    result_users = await conn.execute(self.CREATE_USERS_TABLE_SQL)
-                    logging.info(f"Table 'users' checked/created successfully. Result: {result_users}")
+            return await apply_migrations(pool)
+        except Exception as e:
+            logging.error(f"Error during database schema migration: {e}")
+            raise
 
-                    result_codes = await conn.execute(self.CREATE_TEMP_CODES_TABLE_SQL)
-                    logging.info(f"Table 'temporary_codes' checked/created successfully. Result: {result_codes}")
+    async def _init_connection(self, conn):
+        if self._schema_ready:
+            await conn.prepare_registry()
 
-                    result_index = await conn.execute(self.CREATE_TEMP_CODES_INDEX_SQL)
-                    logging.info(f"Indexes for 'temporary_codes' checked/created successfully. Result: {result_index}")
+    async def _warm_up(self, pool):
+        connections = []
+        try:
+            for _ in range(self.min_pool_size):
+                connections.append(await pool.acquire())
+            await asyncio.gather(*(conn.prepare_registry() for conn in connections))
+            logging.info(f"Warmed up {len(connections)} pooled connections with prepared statements.")
+        finally:
+            for conn in connections:
+                await pool.release(conn)
 
-                    result_actions = await conn.execute(self.CREATE_ADMIN_ACTIONS_TABLE_SQL)
-                    logging.info(f"Table 'admin_actions' checked/created successfully. Result: {result_actions}")
+    async def connect(self):
+        if self._pool is not None:
+            return self._pool
+        async with self._connect_lock:
+            if self._pool is not None:
+                return self._pool
+            try:
+                self._pool = await self.backend.open(self)
+            except Exception as e:
+                logging.error(f"Error connecting to database: {e}")
+                return self._pool
 
-                    result_actions_idx = await conn.execute(self.CREATE_ADMIN_ACTIONS_INDEX_SQL)
-                    logging.info(
-                        f"Indexes for 'admin_actions' checked/created successfully. Result: {result_actions_idx}")
-                    return True
+            if self.backend.supports_replicas:
+                for replica in self._replicas:
+                    await self._refresh_replica(replica)
+        return self._pool
 
+    async def use_backend(self, backend):
+        await self.close()
+        self.backend = backend
+        self._schema_ready = False
+        logging.info(f"Database backend switched to {backend.name}.")
+
+    async def _connect_replica(self, replica: Replica):
+        try:
+            replica.pool = await asyncpg.create_pool(
+                dsn=replica.dsn,
+                timeout=REPLICA_CONNECT_TIMEOUT,
+                min_size=1,
+                max_size=self.max_pool_size,
+                max_inactive_connection_lifetime=self.max_inactive_connection_lifetime,
+                statement_cache_size=self.statement_cache_size,
+                command_timeout=self.command_timeout,
+                connection_class=RegistryConnection,
+                init=self._init_connection
+            )
+            logging.info(f"Successfully created read replica pool for {replica.label}")
         except Exception as e:
-            logging.error(f"Error during database schema initialization (CREATE TABLE users): {e}")
-            raise
+            logging.error(f"Error connecting to read replica {replica.label}: {e}")
+            replica.pool = None
 
-    async def connect(self):
-        if self._pool is None:
+    async def _refresh_replica(self, replica: Replica):
+        async with replica.refresh_lock:
+            now = time.monotonic()
+            if replica.checked_at and now - replica.checked_at < self.replica_lag_check_interval:
+                return
+            if replica.pool is None:
+                await self._connect_replica(replica)
+                if replica.pool is None:
+                    replica.mark_failed(now)
+                    return
             try:
-                self._pool = await asyncpg.create_pool(
-                    host=self.host,
-                    port=self.port,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database
-                )
-                logging.info(f"Successfully created connection pool for {self.database} in {self.host}:{self.port}")
-
-                await self._initialize_schema(self._pool)
-                logging.info("Database schema initialized successfully.")
+                async with self._acquire(replica.pool) as conn:
+                    replica.lag_seconds = float(await conn.fetchval(REPLICA_LAG_SQL))
+                replica.healthy = replica.lag_seconds <= self.replica_max_lag_seconds
+                replica.checked_at = now
+                if not replica.healthy:
+                    logging.warning(
+                        f"Read replica {replica.label} lags by {replica.lag_seconds:.1f}s "
+                        f"(max {self.replica_max_lag_seconds}s). Routing reads to primary.")
             except Exception as e:
-                logging.error(f"Error connecting to database: {e}")
-                self._pool = None
-        return self._pool
+                logging.error(f"Lag check failed for read replica {replica.label}: {e}")
+                replica.mark_failed(now)
+
+    async def _choose_replica(self) -> Replica | None:
+        if not self.backend.supports_replicas:
+            return None
+        replica_count = len(self._replicas)
+        for offset in range(replica_count):
+            replica = self._replicas[(self._next_replica + offset) % replica_count]
+            if time.monotonic() - replica.checked_at >= self.replica_lag_check_interval \
+                    and not replica.refresh_lock.locked():
+                task = asyncio.create_task(self._refresh_replica(replica))
+                self._replica_refresh_tasks.add(task)
+                task.add_done_callback(self._replica_refresh_tasks.discard)
+            if replica.healthy:
+                self._next_replica = (self._next_replica + offset + 1) % replica_count
+                return replica
+        return None
+
+    async def _fetch_readonly(self, method: str, query, args):
+        if self._pool is None:
+            await self.connect()
+        replica = await self._choose_replica()
+        if replica is None:
+            return None, False
+        try:
+            async with self._acquire(replica.pool) as conn:
+                return await self._run_query(conn, method, query, args), True
+        except REPLICA_CONNECTION_ERRORS as e:
+            logging.warning(f"Read replica {replica.label} is unavailable, falling back to primary: {e}")
+            replica.mark_failed(time.monotonic())
+        except Exception as e:
+            logging.warning(f"Read-only query failed on replica {replica.label}, retrying on primary: {e}")
+        return None, False
 
     async def close(self):
+        for replica in self._replicas:
+            if replica.pool:
+                try:
+                    await replica.pool.close()
+                except Exception as e:
+                    logging.error(f"Error closing read replica pool {replica.label}: {e}")
+                replica.pool = None
+                replica.mark_failed(0.0)
         if self._pool:
             try:
                 await self._pool.close()
@@ -118,59 +193,272 @@ class DatabaseManager:
             except Exception as e:
                 logging.error(f"Error closing database connection pool: {e}")
 
+    def get_pool_stats(self) -> PoolStats:
+        return self.pool_metrics.snapshot(self._pool, self.min_pool_size, self.max_pool_size)
+
+    def get_replica_stats(self) -> list[ReplicaStats]:
+        return [replica.stats() for replica in self._replicas]
+
+    def get_breaker_stats(self) -> BreakerStats:
+        return self.breaker.stats()
+
+    def get_query_stats(self, limit: int | None = None) -> list[QueryStats]:
+        return self.query_metrics.snapshot(limit)
+
+    def get_slow_queries(self) -> list[SlowQueryEntry]:
+        return list(self.query_metrics.slow_log)
+
+    async def _run_query(self, conn, method: str, query, args):
+        return await self._timed(query_fingerprint(query), getattr(conn, method)(query, *args), query, args)
+
+    async def _timed(self, fingerprint: str, operation, query=None, args=(), rows: int | None = None):
+        started = time.perf_counter()
+        try:
+            result = await operation
+        except Exception:
+            self.query_metrics.record(fingerprint, time.perf_counter() - started, failed=True)
+            raise
+        elapsed = time.perf_counter() - started
+        rows = rows if rows is not None else count_result_rows(result)
+        slow_entry = self.query_metrics.record(fingerprint, elapsed, rows)
+        if slow_entry is not None:
+            logging.warning(
+                f"Slow query ({slow_entry['duration_ms']:.0f} ms, {slow_entry['rows']} rows): {slow_entry['fingerprint']}")
+            if query is not None:
+                self._maybe_explain(slow_entry, query, args)
+        return result
+
+    def _maybe_explain(self, slow_entry: SlowQueryEntry, query, args):
+        if self.explain_sample_rate <= 0 or self._explain_task is not None:
+            return
+        sql = query.sql if isinstance(query, NamedQuery) else query
+        if not EXPLAINABLE_QUERY_RE.match(sql) or WRITE_KEYWORDS_RE.search(sql):
+            return
+        if random.random() >= self.explain_sample_rate:
+            return
+        self._explain_task = asyncio.create_task(self._explain(slow_entry, sql, args))
+        self._explain_task.add_done_callback(self._clear_explain_task)
+
+    def _clear_explain_task(self, _task):
+        self._explain_task = None
+
+    async def _explain(self, slow_entry: SlowQueryEntry, sql: str, args):
+        try:
+            async with self._acquire() as conn:
+                plan_rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", *args)
+            slow_entry['plan'] = "\n".join(row[0] for row in plan_rows)
+            logging.warning(f"Plan for slow query {slow_entry['fingerprint']}:\n{slow_entry['plan']}")
+        except Exception as e:
+            logging.error(f"Failed to capture EXPLAIN for slow query {slow_entry['fingerprint']}: {e}")
+
+    @asynccontextmanager
+    async def _acquire(self, pool=None):
+        pool = pool or self._pool
+        metrics = self.pool_metrics
+        started = time.perf_counter()
+        metrics.waiting += 1
+        try:
+            conn = await pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            waited = time.perf_counter() - started
+            metrics.record_timeout(waited)
+            logging.error(f"Timed out acquiring a pooled connection after {waited:.2f}s. Pool: {self.get_pool_stats()}")
+            raise
+        finally:
+            metrics.waiting -= 1
+        metrics.record_acquire(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    def _record_failure(self, error: Exception):
+        if not isinstance(error, BREAKER_FAILURE_ERRORS):
+            self.breaker.record_success()
+            return
+        if self.breaker.record_failure():
+            logging.warning(
+                f"Database circuit breaker opened after {self.breaker.consecutive_failures} consecutive failures, "
+                f"failing fast for {self.breaker.reset_timeout}s: {error}")
+
     async def get_connection(self):
+        if not self.breaker.allow_request():
+            logging.warning("Database circuit breaker is open, rejecting request without acquiring a connection.")
+            return None
         if self._pool is None:
             logging.info("Connection is not set. Trying to connect...")
             pool = await self.connect()
             if pool is None:
                 logging.error("Failed to establish database connection after attempt. Cannot acquire connection.")
+                self._record_failure(ConnectionError("connection pool is not available"))
                 return None
-        return self._pool.acquire()
+        return self._acquire()
 
-    async def execute(self, query, *args):
+    @asynccontextmanager
+    async def unit(self):
         conn_context = await self.get_connection()
         if conn_context is None:
-            logging.error(f"Cannot execute query, failed to get connection.")
-            return None
-        async with conn_context as conn:
-            if conn is None:
+            raise ConnectionError("Cannot open unit of work, failed to get connection.")
+        try:
+            async with conn_context as conn:
+                async with conn.transaction():
+                    yield UnitOfWork(self, conn)
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        self.breaker.record_success()
+
+    async def _call(self, method: str, query, args, retry: bool = False):
+        attempts = self.retry_policy.attempts if retry else 1
+        for attempt in range(attempts):
+            conn_context = await self.get_connection()
+            if conn_context is None:
                 return None
             try:
-                result = await conn.execute(query, *args)
+                async with conn_context as conn:
+                    result = await self._run_query(conn, method, query, args)
+                self.breaker.record_success()
                 return result
+            except asyncio.TimeoutError as e:
+                self._record_failure(e)
+                raise
+            except TRANSIENT_DB_ERRORS as e:
+                self._record_failure(e)
+                if attempt + 1 >= attempts:
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                self.breaker.retries += 1
+                logging.warning(
+                    f"Transient database error on {method} `{query_fingerprint(query)}` "
+                    f"(attempt {attempt + 1}/{attempts}), retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
             except Exception as e:
-                logging.error(f"Error executing query: {e}")
-                return None
+                self._record_failure(e)
+                raise
+
+    async def execute(self, query, *args):
+        try:
+            return await self._call('execute', query, args)
+        except Exception as e:
+            logging.error(f"Error executing query: {e}")
+            return None
 
-    async def fetch_one(self, query, *args):
+    async def execute_returning(self, query, *args):
+        try:
+            return await self._call('fetchrow', query, args)
+        except Exception as e:
+            logging.error(f"Execute returning error for request `{query_fingerprint(query)}` with args {args}: {e}")
+            return None
+
+    async def fetch_one(self, query, *args, retry: bool = True):
+        try:
+            return await self._call('fetchrow', query, args, retry=retry)
+        except Exception as e:
+            logging.error(f"Fetch one error for request `{query}` with args {args}: {e}")
+            return None
+
+    async def fetch_all(self, query, *args, retry: bool = True):
+        try:
+            return await self._call('fetch', query, args, retry=retry)
+        except Exception as e:
+            logging.error(f"Fetch all error for request `{query}` with args {args}: {e}")
+            return None
+
+    async def fetch_one_readonly(self, query, *args):
+        result, served = await self._fetch_readonly('fetchrow', query, args)
+        if served:
+            return result
+        return await self.fetch_one(query, *args)
+
+    async def fetch_all_readonly(self, query, *args):
+        result, served = await self._fetch_readonly('fetch', query, args)
+        if served:
+            return result
+        return await self.fetch_all(query, *args)
+
+    async def execute_many(self, query, args_list):
+        args_list = list(args_list)
+        if not args_list:
+            return 0
         conn_context = await self.get_connection()
         if conn_context is None:
-            logging.error(f"Cannot fetch_one, failed to get connection.")
+            logging.error(f"Cannot execute_many, failed to get connection.")
+            return None
+        try:
+            async with conn_context as conn:
+                await self._timed(
+                    query_fingerprint(query), conn.executemany(query, args_list), rows=len(args_list))
+            self.breaker.record_success()
+            return len(args_list)
+        except Exception as e:
+            self._record_failure(e)
+            logging.error(f"Execute many error for request `{query}` ({len(args_list)} rows): {e}")
             return None
-        async with conn_context as conn:
-            if conn is None:
-                return None
-            try:
-                result = await conn.fetchrow(query, *args)
-                return result
-            except Exception as e:
-                logging.error(f"Fetch one error for request `{query}` with args {args}: {e}")
-                return None
 
-    async def fetch_all(self, query, *args):
+    async def copy_records_to_table(self, table_name: str, records, columns: list[str] | None = None):
         conn_context = await self.get_connection()
         if conn_context is None:
-            logging.error(f"Cannot fetch_all, failed to get connection.")
+            logging.error(f"Cannot copy records to {table_name}, failed to get connection.")
             return None
-        async with conn_context as conn:
-            if conn is None:
-                return None
-            try:
-                result = await conn.fetch(query, *args)
-                return result
-            except Exception as e:
-                logging.error(f"Fetch all error for request `{query}` with args {args}: {e}")
-                return None
+        try:
+            async with conn_context as conn:
+                result = await self._timed(
+                    f"COPY {table_name} FROM STDIN",
+                    conn.copy_records_to_table(table_name, records=records, columns=columns))
+            self.breaker.record_success()
+            return result
+        except Exception as e:
+            self._record_failure(e)
+            logging.error(f"Copy records error for table {table_name}: {e}")
+            return None
+
+    async def copy_to(self, query, *args, output, format: str = 'csv', header: bool | None = None):
+        sql = query.sql if isinstance(query, NamedQuery) else query
+        conn_context = await self.get_connection()
+        if conn_context is None:
+            logging.error(f"Cannot copy_to, failed to get connection.")
+            return None
+        try:
+            async with conn_context as conn:
+                result = await self._timed(
+                    f"COPY ({query_fingerprint(query)}) TO STDOUT",
+                    conn.copy_from_query(sql, *args, output=output, format=format, header=header))
+            self.breaker.record_success()
+            return result
+        except Exception as e:
+            self._record_failure(e)
+            logging.error(f"Copy to error for request `{sql}`: {e}")
+            return None
+
+    async def stream(self, query, *args, batch: int = 500, readonly: bool = False):
+        if not self.breaker.allow_request():
+            raise ConnectionError("Cannot stream query, database circuit breaker is open.")
+        if self._pool is None and await self.connect() is None:
+            raise ConnectionError("Cannot stream query, failed to get connection.")
+        pool = None
+        if readonly:
+            replica = await self._choose_replica()
+            pool = replica.pool if replica is not None else None
+
+        sql = query.sql if isinstance(query, NamedQuery) else query
+        fingerprint = f"stream: {query_fingerprint(query)}"
+        started = time.perf_counter()
+        rows = 0
+        failed = False
+        try:
+            async with self._acquire(pool) as conn:
+                async with conn.transaction(isolation='repeatable_read', readonly=True):
+                    async for record in conn.cursor(query, *args, prefetch=batch):
+                        rows += 1
+                        yield record
+            self.breaker.record_success()
+        except Exception as e:
+            failed = True
+            self._record_failure(e)
+            logging.error(f"Stream error for request `{sql}` after {rows} rows: {e}")
+            raise
+        finally:
+            self.query_metrics.record(fingerprint, time.perf_counter() - started, rows, failed=failed)
 
 
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -0,0 +1,555 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import asyncpg
+
+from src.database.queries import NamedQuery
+
+MONEY_QUANTUM = Decimal('0.01')
+
+
+def _money(value) -> Decimal | None:
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(MONEY_QUANTUM)
+
+
+def _utc_date(moment: datetime):
+    return moment.astimezone(timezone.utc).date()
+
+
+def _pick(row: dict, *columns: str) -> dict:
+    return {column: row[column] for column in columns}
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self.users: dict[int, dict] = {}
+        self.temporary_codes: dict[int, dict] = {}
+        self.code_ids_by_secret: dict[str, int] = {}
+        self.admin_actions: dict[int, dict] = {}
+        self.broadcast_jobs: dict[int, dict] = {}
+        self.broadcast_deliveries: dict[tuple[int, int], dict] = {}
+        self.next_code_id = 1
+        self.next_action_id = 1
+        self.next_broadcast_job_id = 1
+        self.write_lock = asyncio.Lock()
+
+
+class MemoryTransaction:
+    def __init__(self, conn: 'MemoryConnection', readonly: bool):
+        self._conn = conn
+        self._readonly = readonly
+        self._outermost = False
+
+    async def __aenter__(self):
+        if self._conn._undo is not None:
+            return self
+        self._outermost = True
+        if not self._readonly:
+            await self._conn.database.write_lock.acquire()
+        self._conn._undo = []
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if not self._outermost:
+            return False
+        undo, self._conn._undo = self._conn._undo, None
+        if exc_type is not None:
+            for revert in reversed(undo):
+                revert()
+        if not self._readonly:
+            self._conn.database.write_lock.release()
+        return False
+
+
+class MemoryConnection:
+    def __init__(self, database: MemoryDatabase):
+        self.database = database
+        self._undo: list | None = None
+
+    async def prepare_registry(self):
+        return None
+
+    def is_in_transaction(self) -> bool:
+        return self._undo is not None
+
+    def transaction(self, isolation: str | None = None, readonly: bool = False, deferrable: bool = False):
+        return MemoryTransaction(self, readonly)
+
+    def _journal(self, revert):
+        if self._undo is not None:
+            self._undo.append(revert)
+
+    def _run(self, query, args) -> tuple[list[dict], str]:
+        if not isinstance(query, NamedQuery):
+            raise NotImplementedError(f"In-memory backend only supports registered queries, got: {query.strip()[:80]}")
+        handler = getattr(self, f"_q_{query.name}", None)
+        if handler is None:
+            raise NotImplementedError(f"In-memory backend has no implementation for query `{query.name}`")
+        return handler(*args)
+
+    async def execute(self, query, *args, timeout=None):
+        return self._run(query, args)[1]
+
+    async def executemany(self, query, args, timeout=None):
+        for params in args:
+            self._run(query, params)
+
+    async def fetch(self, query, *args, timeout=None):
+        return self._run(query, args)[0]
+
+    async def fetchrow(self, query, *args, timeout=None):
+        rows = self._run(query, args)[0]
+        return rows[0] if rows else None
+
+    async def fetchval(self, query, *args, column: int = 0, timeout=None):
+        row = await self.fetchrow(query, *args)
+        return list(row.values())[column] if row else None
+
+    def cursor(self, query, *args, prefetch=None, timeout=None):
+        return self._iterate(self._run(query, args)[0])
+
+    @staticmethod
+    async def _iterate(rows: list[dict]):
+        for row in rows:
+            yield row
+
+    def _insert_user(self, user_id: int, name: str | None = None) -> dict:
+        user = {
+            'user_id': user_id,
+            'name': name,
+            'phone_number': None,
+            'registration_date': datetime.now(timezone.utc),
+            'total_spent': Decimal('0.00'),
+            'hookah_count': 0,
+            'free_hookahs_available': 0,
+            'is_reachable': True,
+            'unreachable_since': None,
+            'unreachable_reason': None,
+        }
+        users = self.database.users
+        users[user_id] = user
+        self._journal(lambda: users.pop(user_id, None))
+        return user
+
+    def _update(self, row: dict, **changes):
+        previous = {column: row[column] for column in changes}
+        row.update(changes)
+        self._journal(lambda: row.update(previous))
+
+    def _delete_code(self, code_id: int) -> dict:
+        codes = self.database.temporary_codes
+        by_secret = self.database.code_ids_by_secret
+        row = codes.pop(code_id)
+        by_secret.pop(row['secret_code'], None)
+
+        def revert():
+            codes[code_id] = row
+            by_secret[row['secret_code']] = code_id
+
+        self._journal(revert)
+        return row
+
+    def _code_by_secret(self, secret_code: str) -> dict | None:
+        code_id = self.database.code_ids_by_secret.get(secret_code)
+        return self.database.temporary_codes.get(code_id) if code_id is not None else None
+
+    def _find_codes(self, secret_code: str, user_id: int) -> list[dict]:
+        row = self._code_by_secret(secret_code)
+        return [row] if row is not None and row['user_id'] == user_id else []
+
+    def _q_start_user(self, user_id):
+        user = self.database.users.get(user_id)
+        if user is None:
+            return [], "SELECT 0"
+        restored = not user['is_reachable']
+        if restored:
+            self._update(user, is_reachable=True, unreachable_since=None, unreachable_reason=None)
+        return [{'user_id': user_id, 'restored': restored}], "SELECT 1"
+
+    def _q_get_user_profile(self, user_id):
+        user = self.database.users.get(user_id)
+        rows = [_pick(user, 'name', 'total_spent', 'hookah_count', 'free_hookahs_available')] if user else []
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_get_user_initial_data(self, user_id):
+        user = self.database.users.get(user_id)
+        rows = [_pick(user, 'name', 'phone_number', 'free_hookahs_available')] if user else []
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_resolve_token(self, secret_code, now):
+        row = self._code_by_secret(secret_code)
+        user = self.database.users.get(row['user_id']) if row is not None and row['expires_at'] > now else None
+        rows = [{**_pick(row, 'user_id', 'expires_at'),
+                 **_pick(user, 'name', 'phone_number', 'free_hookahs_available')}] if user is not None else []
+        return rows, f"SELECT {len(rows)}"
+
+    def _insert_code(self, user_id, secret_code, expires_at) -> bool:
+        if user_id not in self.database.users:
+            raise asyncpg.ForeignKeyViolationError(
+                f'insert on table "temporary_codes" violates foreign key constraint for user_id {user_id}')
+        database = self.database
+        if secret_code in database.code_ids_by_secret:
+            return False
+        code_id = database.next_code_id
+        database.next_code_id += 1
+        database.temporary_codes[code_id] = {
+            'id': code_id,
+            'user_id': user_id,
+            'secret_code': secret_code,
+            'expires_at': expires_at,
+            'created_at': datetime.now(timezone.utc),
+            'message_id': None,
+        }
+        database.code_ids_by_secret[secret_code] = code_id
+
+        def revert():
+            database.temporary_codes.pop(code_id, None)
+            database.code_ids_by_secret.pop(secret_code, None)
+
+        self._journal(revert)
+        return True
+
+    def _rekey_code(self, row: dict, secret_code: str):
+        database = self.database
+        old_secret_code = row['secret_code']
+        database.code_ids_by_secret.pop(old_secret_code, None)
+        database.code_ids_by_secret[secret_code] = row['id']
+        self._update(row, secret_code=secret_code)
+
+        def revert():
+            database.code_ids_by_secret.pop(secret_code, None)
+            database.code_ids_by_secret[old_secret_code] = row['id']
+
+        self._journal(revert)
+
+    def _q_issue_code(self, user_id, secret_code, now, expires_at, reuse_min_ttl, extend):
+        if user_id not in self.database.users:
+            self._insert_user(user_id)
+
+        taken = self._code_by_secret(secret_code)
+        if taken is not None and taken['user_id'] != user_id:
+            return [dict.fromkeys(('secret_code', 'expires_at', 'reused', 'stale_codes', 'stale_message_ids'))], \
+                "SELECT 1"
+
+        current = next((row for row in self.database.temporary_codes.values() if row['user_id'] == user_id), None)
+        if current is None:
+            self._insert_code(user_id, secret_code, expires_at)
+            return [{
+                'secret_code': secret_code,
+                'expires_at': expires_at,
+                'reused': False,
+                'stale_codes': [],
+                'stale_message_ids': [],
+            }], "SELECT 1"
+
+        previous_code, previous_message_id = current['secret_code'], current['message_id']
+        if reuse_min_ttl is not None and current['expires_at'] > now + timedelta(seconds=reuse_min_ttl):
+            if extend:
+                self._update(current, expires_at=expires_at)
+        else:
+            self._rekey_code(current, secret_code)
+            self._update(current, expires_at=expires_at, message_id=None, created_at=now)
+        return [{
+            'secret_code': current['secret_code'],
+            'expires_at': current['expires_at'],
+            'reused': current['secret_code'] == previous_code,
+            'stale_codes': [previous_code],
+            'stale_message_ids': [previous_message_id],
+        }], "SELECT 1"
+
+    def _q_set_code_message_ids(self, secret_codes, user_ids, message_ids):
+        updated = 0
+        for secret_code, user_id, message_id in zip(secret_codes, user_ids, message_ids):
+            for row in self._find_codes(secret_code, user_id):
+                self._update(row, message_id=message_id)
+                updated += 1
+        return [], f"UPDATE {updated}"
+
+    def _q_get_user_for_update(self, user_id):
+        user = self.database.users.get(user_id)
+        rows = [_pick(user, 'name', 'phone_number', 'hookah_count', 'free_hookahs_available', 'total_spent')] \
+            if user else []
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_update_user_balance(self, amount, hookahs_added, used_free, earned_free, user_id):
+        user = self.database.users.get(user_id)
+        if not user or user['free_hookahs_available'] < used_free:
+            return [], "UPDATE 0"
+        self._update(
+            user,
+            total_spent=user['total_spent'] + _money(amount),
+            hookah_count=user['hookah_count'] + hookahs_added,
+            free_hookahs_available=user['free_hookahs_available'] - used_free + earned_free
+        )
+        return [_pick(user, 'name', 'phone_number', 'total_spent', 'hookah_count', 'free_hookahs_available')], \
+            "UPDATE 1"
+
+    def _q_get_code_message_id(self, secret_code, user_id):
+        rows = [_pick(row, 'message_id') for row in self._find_codes(secret_code, user_id)]
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_delete_code(self, secret_code, user_id):
+        matched = self._find_codes(secret_code, user_id)
+        for row in matched:
+            self._delete_code(row['id'])
+        return [], f"DELETE {len(matched)}"
+
+    def _q_insert_admin_action(self, admin_id, admin_name, admin_username, action_type, user_id, client_name,
+                               client_phone_number, amount, hookah_count):
+        database = self.database
+        action_id = database.next_action_id
+        database.next_action_id += 1
+        database.admin_actions[action_id] = {
+            'id': action_id,
+            'admin_id': admin_id,
+            'admin_name': admin_name,
+            'admin_username': admin_username,
+            'action_type': action_type,
+            'user_id': user_id,
+            'client_name': client_name,
+            'client_phone_number': client_phone_number,
+            'amount': _money(amount),
+            'hookah_count': hookah_count,
+            'action_date': datetime.now(timezone.utc),
+        }
+        self._journal(lambda: database.admin_actions.pop(action_id, None))
+        return [], "INSERT 0 1"
+
+    def _q_save_user_name(self, user_id, name):
+        user = self.database.users.get(user_id)
+        if user is None:
+            self._insert_user(user_id, name)
+        else:
+            self._update(user, name=name)
+        return [], "INSERT 0 1"
+
+    def _q_save_user_phone(self, phone_number, user_id):
+        user = self.database.users.get(user_id)
+        if user is None:
+            return [], "UPDATE 0"
+        self._update(user, phone_number=phone_number)
+        return [], "UPDATE 1"
+
+    def _q_list_clients(self):
+        rows = [dict(user) for user in sorted(self.database.users.values(), key=lambda row: row['registration_date'])]
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_estimate_user_count(self, estimate_threshold):
+        user_count = sum(1 for user in self.database.users.values() if user['is_reachable'])
+        return [{'user_count': user_count, 'estimated': False}], "SELECT 1"
+
+    def _q_delete_expired_codes(self, now, limit):
+        expired = sorted((row['expires_at'], code_id) for code_id, row in self.database.temporary_codes.items()
+                         if row['expires_at'] < now)
+        rows = [self._with_reachability(self._delete_code(code_id)) for _, code_id in expired[:limit]]
+        return rows, f"DELETE {len(rows)}"
+
+    def _with_reachability(self, code: dict) -> dict:
+        user = self.database.users[code['user_id']]
+        return {**_pick(code, 'secret_code', 'user_id', 'message_id'), 'is_reachable': user['is_reachable']}
+
+    def _q_list_code_expiries(self):
+        rows = [_pick(row, 'secret_code', 'user_id', 'expires_at') for row in self.database.temporary_codes.values()]
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_expire_codes(self, secret_codes, user_ids, now):
+        rows = []
+        for secret_code, user_id in zip(secret_codes, user_ids):
+            for row in self._find_codes(secret_code, user_id):
+                if row['expires_at'] <= now:
+                    code_id = self.database.code_ids_by_secret[secret_code]
+                    rows.append(self._with_reachability(self._delete_code(code_id)))
+        return rows, f"DELETE {len(rows)}"
+
+    def _actions_between(self, start_date, end_date):
+        for action in self.database.admin_actions.values():
+            action_date = _utc_date(action['action_date'])
+            if start_date is not None and action_date < start_date:
+                continue
+            if end_date is not None and action_date > end_date:
+                continue
+            yield action_date, action
+
+    def _q_waiters_report(self, admin_ids, start_date, end_date):
+        admin_ids = set(admin_ids)
+        groups: dict[tuple, dict] = {}
+        for action_date, action in self._actions_between(start_date, end_date):
+            if action['admin_id'] not in admin_ids:
+                continue
+            display_name = action['admin_name'] or action['admin_username'] or str(action['admin_id'])
+            group = groups.setdefault((action_date, action['admin_id'], display_name), {
+                'report_date': action_date,
+                'admin_id': action['admin_id'],
+                'admin_display_name': display_name,
+                'registered': set(),
+                'total_amount_today': Decimal('0'),
+            })
+            if action['action_type'] == 'user_registered' and action['user_id'] is not None:
+                group['registered'].add(action['user_id'])
+            elif action['action_type'] == 'transaction' and action['amount'] is not None:
+                group['total_amount_today'] += action['amount']
+
+        rows = sorted(groups.values(), key=lambda row: row['admin_display_name'])
+        rows.sort(key=lambda row: row['report_date'], reverse=True)
+        for row in rows:
+            row['new_users_registered_today'] = len(row.pop('registered'))
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_serviced_clients_report(self, start_date, end_date):
+        actions = sorted(
+            ((action_date, action) for action_date, action in self._actions_between(start_date, end_date)
+             if action['action_type'] == 'transaction'),
+            key=lambda item: item[1]['action_date'], reverse=True)
+        rows = [{
+            'report_date': action_date,
+            'client_name': action['client_name'] or 'N/A',
+            'client_phone_number': action['client_phone_number'] or 'N/A',
+            'check_amount': action['amount'],
+            'ordered_hookahs': action['hookah_count'],
+            'admin_display_name': action['admin_name'] or action['admin_username'] or str(action['admin_id']),
+        } for action_date, action in actions]
+        return rows, f"SELECT {len(rows)}"
+
+    def _job_deliveries(self, job_id, *statuses):
+        return [row for (delivery_job_id, _), row in sorted(self.database.broadcast_deliveries.items())
+                if delivery_job_id == job_id and row['status'] in statuses]
+
+    def _q_create_broadcast_job(self, admin_id, content_type, text, photo_id, total):
+        database = self.database
+        job_id = database.next_broadcast_job_id
+        database.next_broadcast_job_id += 1
+        database.broadcast_jobs[job_id] = {
+            'id': job_id,
+            'admin_id': admin_id,
+            'content_type': content_type,
+            'text': text,
+            'photo_id': photo_id,
+            'status': 'running',
+            'total': total,
+            'sent': 0,
+            'failed': 0,
+            'created_at': datetime.now(timezone.utc),
+            'finished_at': None,
+        }
+        self._journal(lambda: database.broadcast_jobs.pop(job_id, None))
+        return [_pick(database.broadcast_jobs[job_id], 'id', 'total')], "INSERT 0 1"
+
+    def _q_get_broadcast_job(self, job_id):
+        job = self.database.broadcast_jobs.get(job_id)
+        rows = [dict(job)] if job is not None else []
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_list_broadcast_jobs(self, limit):
+        jobs = sorted(self.database.broadcast_jobs.values(), key=lambda job: job['id'], reverse=True)[:limit]
+        rows = [_pick(job, 'id', 'status', 'total', 'sent', 'failed', 'created_at') for job in jobs]
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_list_running_broadcast_jobs(self):
+        rows = [{'id': job_id} for job_id, job in sorted(self.database.broadcast_jobs.items())
+                if job['status'] == 'running']
+        return rows, f"SELECT {len(rows)}"
+
+    def _q_set_broadcast_job_status(self, job_id, status, allowed_from):
+        job = self.database.broadcast_jobs.get(job_id)
+        if job is None or job['status'] not in allowed_from:
+            return [], "UPDATE 0"
+        finished_at = datetime.now(timezone.utc) if status in ('completed', 'cancelled') else job['finished_at']
+        total = job['sent'] + job['failed'] if status == 'completed' else job['total']
+        self._update(job, status=status, finished_at=finished_at, total=total)
+        return [_pick(job, 'id', 'status', 'total')], "UPDATE 1"
+
+    def _q_release_broadcast_claims(self, job_id):
+        claimed = self._job_deliveries(job_id, 'sending')
+        for row in claimed:
+            self._update(row, status='pending')
+        return [], f"UPDATE {len(claimed)}"
+
+    def _q_claim_broadcast_deliveries(self, job_id, limit, after_user_id):
+        database = self.database
+        now = datetime.now(timezone.utc)
+        page = sorted(user_id for user_id, user in database.users.items()
+                      if user['is_reachable'] and user_id > after_user_id)[:limit]
+        keys = [(job_id, user_id) for user_id in page if (job_id, user_id) not in database.broadcast_deliveries]
+        for key in keys:
+            database.broadcast_deliveries[key] = {
+                'job_id': job_id, 'user_id': key[1], 'status': 'sending', 'error': None, 'updated_at': now}
+
+        def revert():
+            for key in keys:
+                database.broadcast_deliveries.pop(key, None)
+
+        self._journal(revert)
+        return [{'next_cursor': page[-1] if page else None, 'user_ids': [key[1] for key in keys]}], "SELECT 1"
+
+    def _q_claim_released_broadcast_deliveries(self, job_id, limit):
+        now = datetime.now(timezone.utc)
+        claimed = self._job_deliveries(job_id, 'pending')[:limit]
+        for row in claimed:
+            self._update(row, status='sending', updated_at=now)
+        return [_pick(row, 'user_id') for row in claimed], f"UPDATE {len(claimed)}"
+
+    def _q_record_broadcast_deliveries(self, job_id, user_ids, statuses, errors):
+        job = self.database.broadcast_jobs.get(job_id)
+        if job is None:
+            return [], "UPDATE 0"
+        now = datetime.now(timezone.utc)
+        sent = failed = 0
+        for user_id, status, error in zip(user_ids, statuses, errors):
+            row = self.database.broadcast_deliveries.get((job_id, user_id))
+            if row is None or row['status'] != 'sending':
+                continue
+            self._update(row, status=status, error=error, updated_at=now)
+            if status == 'sent':
+                sent += 1
+                continue
+            failed += 1
+            user = self.database.users.get(user_id)
+            if status == 'unreachable' and user is not None and user['is_reachable']:
+                self._update(user, is_reachable=False, unreachable_since=now, unreachable_reason=error)
+        self._update(job, sent=job['sent'] + sent, failed=job['failed'] + failed)
+        return [_pick(job, 'sent', 'failed')], "UPDATE 1"
+
+
+class MemoryPool:
+    def __init__(self, database: MemoryDatabase, size: int):
+        self._size = size
+        self._idle = deque(MemoryConnection(database) for _ in range(size))
+        self._available = asyncio.Semaphore(size)
+
+    async def acquire(self, timeout: float | None = None) -> MemoryConnection:
+        await asyncio.wait_for(self._available.acquire(), timeout)
+        return self._idle.popleft()
+
+    async def release(self, conn: MemoryConnection):
+        self._idle.append(conn)
+        self._available.release()
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_idle_size(self) -> int:
+        return len(self._idle)
+
+    async def close(self):
+        return None
+
+    def terminate(self):
+        return None
+
+
+class MemoryBackend:
+    name = 'memory'
+    supports_replicas = False
+
+    def __init__(self, database: MemoryDatabase | None = None):
+        self.database = database or MemoryDatabase()
+
+    async def open(self, manager):
+        manager._schema_ready = True
+        logging.info(f"Using in-memory database backend (pool size {manager.max_pool_size}).")
+        return MemoryPool(self.database, manager.max_pool_size)
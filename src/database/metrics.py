@@ -0,0 +1,183 @@
+import re
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import TypedDict
+
+from src.database.queries import NamedQuery
+
+
+class PoolStats(TypedDict):
+    size: int
+    in_use: int
+    idle: int
+    min_size: int
+    max_size: int
+    waiting: int
+    acquires: int
+    acquire_timeouts: int
+    acquire_wait_avg_ms: float
+    acquire_wait_max_ms: float
+    acquire_wait_last_ms: float
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.waiting = 0
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def record_acquire(self, wait_seconds: float):
+        self.acquires += 1
+        self.total_wait += wait_seconds
+        self.last_wait = wait_seconds
+        if wait_seconds > self.max_wait:
+            self.max_wait = wait_seconds
+
+    def record_timeout(self, wait_seconds: float):
+        self.acquire_timeouts += 1
+        self.last_wait = wait_seconds
+        if wait_seconds > self.max_wait:
+            self.max_wait = wait_seconds
+
+    def snapshot(self, pool, min_size: int, max_size: int) -> PoolStats:
+        size = pool.get_size() if pool else 0
+        idle = pool.get_idle_size() if pool else 0
+        avg_wait = self.total_wait / self.acquires if self.acquires else 0.0
+        return PoolStats(
+            size=size,
+            in_use=size - idle,
+            idle=idle,
+            min_size=min_size,
+            max_size=max_size,
+            waiting=self.waiting,
+            acquires=self.acquires,
+            acquire_timeouts=self.acquire_timeouts,
+            acquire_wait_avg_ms=round(avg_wait * 1000, 2),
+            acquire_wait_max_ms=round(self.max_wait * 1000, 2),
+            acquire_wait_last_ms=round(self.last_wait * 1000, 2)
+        )
+
+
+class QueryStats(TypedDict):
+    fingerprint: str
+    count: int
+    errors: int
+    total_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    rows: int
+
+
+class SlowQueryEntry(TypedDict):
+    fingerprint: str
+    duration_ms: float
+    rows: int
+    recorded_at: datetime
+    plan: str | None
+
+
+def _percentile(ordered: list[float], percent: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+
+class LatencyHistogram:
+    def __init__(self, max_samples: int = 1024):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self._samples: deque[float] = deque(maxlen=max_samples)
+
+    def record(self, seconds: float, rows: int = 0, failed: bool = False):
+        self.count += 1
+        self.total += seconds
+        self.rows += rows
+        if failed:
+            self.errors += 1
+        if seconds > self.max:
+            self.max = seconds
+        self._samples.append(seconds)
+
+    def snapshot(self, fingerprint: str) -> QueryStats:
+        ordered = sorted(self._samples)
+        return QueryStats(
+            fingerprint=fingerprint,
+            count=self.count,
+            errors=self.errors,
+            total_ms=round(self.total * 1000, 2),
+            p50_ms=round(_percentile(ordered, 50) * 1000, 2),
+            p95_ms=round(_percentile(ordered, 95) * 1000, 2),
+            p99_ms=round(_percentile(ordered, 99) * 1000, 2),
+            max_ms=round(self.max * 1000, 2),
+            rows=self.rows
+        )
+
+
+class QueryMetrics:
+    def __init__(self, slow_threshold_ms: float, slow_log_size: int):
+        self.slow_threshold = slow_threshold_ms / 1000
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self.slow_log: deque[SlowQueryEntry] = deque(maxlen=slow_log_size)
+
+    def record(self, fingerprint: str, seconds: float, rows: int = 0, failed: bool = False) -> SlowQueryEntry | None:
+        histogram = self._histograms.get(fingerprint)
+        if histogram is None:
+            histogram = self._histograms[fingerprint] = LatencyHistogram()
+        histogram.record(seconds, rows, failed)
+
+        if self.slow_threshold <= 0 or seconds < self.slow_threshold:
+            return None
+        entry = SlowQueryEntry(
+            fingerprint=fingerprint,
+            duration_ms=round(seconds * 1000, 2),
+            rows=rows,
+            recorded_at=datetime.now(timezone.utc),
+            plan=None
+        )
+        self.slow_log.append(entry)
+        return entry
+
+    def snapshot(self, limit: int | None = None) -> list[QueryStats]:
+        stats = [histogram.snapshot(fingerprint) for fingerprint, histogram in self._histograms.items()]
+        stats.sort(key=lambda item: item['total_ms'], reverse=True)
+        return stats[:limit] if limit else stats
+
+    def reset(self):
+        self._histograms.clear()
+        self.slow_log.clear()
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|(?<![$\w])\d+(?:\.\d+)?")
+
+
+@lru_cache(maxsize=512)
+def _sql_fingerprint(sql: str) -> str:
+    normalized = _WHITESPACE_RE.sub(' ', sql).strip().rstrip(';').strip()
+    return _LITERAL_RE.sub('?', normalized)
+
+
+def query_fingerprint(query) -> str:
+    if isinstance(query, NamedQuery):
+        return query.name
+    return _sql_fingerprint(query)
+
+
+def count_result_rows(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, str):
+        last_token = result.rsplit(' ', 1)[-1]
+        return int(last_token) if last_token.isdigit() else 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import re
+import time
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_KEY = 7_413_370_001
+MIGRATION_STATEMENT_TIMEOUT = 3600
+MIGRATION_LOCK_POLL_SECONDS = 1.0
+
+CREATE_SCHEMA_VERSION_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+"""
+INSERT_SCHEMA_VERSION_SQL = "INSERT INTO schema_version (version, name) VALUES ($1, $2);"
+SCHEMA_VERSION_EXISTS_SQL = "SELECT to_regclass('schema_version') IS NOT NULL;"
+CURRENT_SCHEMA_VERSION_SQL = "SELECT COALESCE(MAX(version), 0) FROM schema_version;"
+TRY_MIGRATION_LOCK_SQL = "SELECT pg_try_advisory_lock($1);"
+RELEASE_MIGRATION_LOCK_SQL = "SELECT pg_advisory_unlock($1);"
+INDEX_IS_INVALID_SQL = """
+SELECT NOT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass($1);
+"""
+
+CONCURRENT_INDEX_NAME_RE = re.compile(r"INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: tuple[str, ...]
+    concurrently: bool = False
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, 'initial_tables', (
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            name VARCHAR(255),
+            phone_number VARCHAR(30),
+            registration_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            total_spent NUMERIC(10,2) NOT NULL DEFAULT 0.00,
+            hookah_count INTEGER NOT NULL DEFAULT 0,
+            free_hookahs_available INTEGER NOT NULL DEFAULT 0
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS temporary_codes (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            secret_code VARCHAR(10) NOT NULL,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            message_id BIGINT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS admin_actions (
+            id SERIAL PRIMARY KEY,
+            admin_id BIGINT NOT NULL,
+            admin_name TEXT,
+            admin_username TEXT,
+            action_type TEXT NOT NULL,
+            user_id BIGINT,
+            client_name TEXT,
+            client_phone_number TEXT,
+            amount NUMERIC(10,2),
+            hookah_count INTEGER,
+            action_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+        );
+        """,
+    )),
+    Migration(2, 'initial_indexes', (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_temporary_codes_expires_at ON temporary_codes (expires_at);",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_temporary_codes_user_id_expires ON temporary_codes (user_id, expires_at);",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_admin_actions_admin_id ON admin_actions (admin_id);",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_admin_actions_action_date ON admin_actions (action_date);",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_admin_actions_user_id ON admin_actions (user_id);",
+    ), concurrently=True),
+    Migration(3, 'dedupe_temporary_codes', (
+        "DELETE FROM temporary_codes WHERE expires_at < now();",
+        """
+        DELETE FROM temporary_codes t
+        USING temporary_codes newer
+        WHERE t.secret_code = newer.secret_code AND t.id < newer.id;
+        """,
+    )),
+    Migration(4, 'unique_secret_code', (
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_temporary_codes_secret_code ON temporary_codes (secret_code);",
+    ), concurrently=True),
+    Migration(5, 'covering_secret_code', (
+        """
+        CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_temporary_codes_secret_code_covering
+        ON temporary_codes (secret_code) INCLUDE (user_id, expires_at);
+        """,
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_temporary_codes_secret_code;",
+    ), concurrently=True),
+    Migration(6, 'broadcast_jobs', (
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id SERIAL PRIMARY KEY,
+            admin_id BIGINT NOT NULL,
+            content_type TEXT NOT NULL,
+            text TEXT,
+            photo_id TEXT,
+            status TEXT NOT NULL DEFAULT 'running',
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP WITH TIME ZONE NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            job_id INTEGER NOT NULL REFERENCES broadcast_jobs(id) ON DELETE CASCADE,
+            user_id BIGINT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            updated_at TIMESTAMP WITH TIME ZONE NULL,
+            PRIMARY KEY (job_id, user_id)
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_open
+        ON broadcast_deliveries (job_id, user_id) WHERE status IN ('pending', 'sending');
+        """,
+    )),
+    Migration(7, 'user_reachability', (
+        """
+        ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS is_reachable BOOLEAN NOT NULL DEFAULT TRUE,
+            ADD COLUMN IF NOT EXISTS unreachable_since TIMESTAMP WITH TIME ZONE NULL,
+            ADD COLUMN IF NOT EXISTS unreachable_reason TEXT NULL;
+        """,
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_reachable ON users (user_id) WHERE is_reachable;",
+    ), concurrently=True),
+    Migration(8, 'one_code_per_user', (
+        """
+        DELETE FROM temporary_codes t
+        USING temporary_codes newer
+        WHERE t.user_id = newer.user_id AND (t.expires_at, t.id) < (newer.expires_at, newer.id);
+        """,
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_temporary_codes_user_id ON temporary_codes (user_id);",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_temporary_codes_user_id_expires;",
+    ), concurrently=True),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+async def get_schema_version(conn) -> int:
+    if not await conn.fetchval(SCHEMA_VERSION_EXISTS_SQL):
+        return 0
+    return await conn.fetchval(CURRENT_SCHEMA_VERSION_SQL)
+
+
+async def _drop_invalid_index(conn, statement: str):
+    match = CONCURRENT_INDEX_NAME_RE.search(statement)
+    if not match:
+        return
+    index_name = match.group(1)
+    if await conn.fetchval(INDEX_IS_INVALID_SQL, index_name):
+        logger.warning(f"Dropping invalid index {index_name} left by an interrupted concurrent build.")
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};", timeout=MIGRATION_STATEMENT_TIMEOUT)
+
+
+async def _apply_migration(conn, migration: Migration):
+    started = time.perf_counter()
+    if migration.concurrently:
+        for statement in migration.statements:
+            await _drop_invalid_index(conn, statement)
+            await conn.execute(statement, timeout=MIGRATION_STATEMENT_TIMEOUT)
+        await conn.execute(INSERT_SCHEMA_VERSION_SQL, migration.version, migration.name)
+    else:
+        async with conn.transaction():
+            for statement in migration.statements:
+                await conn.execute(statement, timeout=MIGRATION_STATEMENT_TIMEOUT)
+            await conn.execute(INSERT_SCHEMA_VERSION_SQL, migration.version, migration.name)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Applied migration {migration.version} ({migration.name}) in {elapsed_ms:.0f} ms.")
+
+
+async def _acquire_migration_lock(conn):
+    deadline = time.monotonic() + MIGRATION_STATEMENT_TIMEOUT
+    while not await conn.fetchval(TRY_MIGRATION_LOCK_SQL, MIGRATION_LOCK_KEY):
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Could not take the migration lock within {MIGRATION_STATEMENT_TIMEOUT}s.")
+        logger.info("Another instance is migrating the schema, waiting for it to finish...")
+        await asyncio.sleep(MIGRATION_LOCK_POLL_SECONDS)
+
+
+async def apply_migrations(pool) -> int:
+    async with pool.acquire() as conn:
+        current_version = await get_schema_version(conn)
+        if current_version >= LATEST_SCHEMA_VERSION:
+            logger.info(f"Database schema is up to date (version {current_version}).")
+            return current_version
+
+        logger.info(f"Database schema version {current_version}, migrating to {LATEST_SCHEMA_VERSION}...")
+        await _acquire_migration_lock(conn)
+        try:
+            await conn.execute(CREATE_SCHEMA_VERSION_TABLE_SQL)
+            current_version = await get_schema_version(conn)
+            for migration in MIGRATIONS:
+                if migration.version <= current_version:
+                    continue
+                await _apply_migration(conn, migration)
+                current_version = migration.version
+        finally:
+            await conn.execute(RELEASE_MIGRATION_LOCK_SQL, MIGRATION_LOCK_KEY)
+
+    logger.info(f"Database schema migrated to version {current_version}.")
+    return current_version
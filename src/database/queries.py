@@ -0,0 +1,284 @@
+from typing import NamedTuple
+
+
+class NamedQuery(NamedTuple):
+    name: str
+    sql: str
+
+
+QUERY_REGISTRY: dict[str, NamedQuery] = {}
+
+
+def register_query(name: str, sql: str) -> NamedQuery:
+    if name in QUERY_REGISTRY:
+        raise ValueError(f"Query `{name}` is already registered")
+    query = NamedQuery(name=name, sql=sql)
+    QUERY_REGISTRY[name] = query
+    return query
+
+
+START_USER = register_query('start_user', """
+WITH restored AS (
+    UPDATE users SET is_reachable = TRUE, unreachable_since = NULL, unreachable_reason = NULL
+    WHERE user_id = $1 AND NOT is_reachable
+    RETURNING user_id
+)
+SELECT user_id, EXISTS (SELECT 1 FROM restored) AS restored FROM users WHERE user_id = $1;
+""")
+
+
+GET_USER_PROFILE = register_query('get_user_profile', """
+SELECT name, total_spent, hookah_count, free_hookahs_available FROM users WHERE user_id = $1;
+""")
+
+GET_USER_INITIAL_DATA = register_query('get_user_initial_data', """
+SELECT name, phone_number, free_hookahs_available FROM users WHERE user_id = $1;
+""")
+
+RESOLVE_TOKEN = register_query('resolve_token', """
+SELECT t.user_id, t.expires_at, u.name, u.phone_number, u.free_hookahs_available
+FROM temporary_codes t
+JOIN users u ON u.user_id = t.user_id
+WHERE t.secret_code = $1 AND t.expires_at > $2;
+""")
+
+
+
+ISSUE_CODE = register_query('issue_code', """
+WITH ensured_user AS (
+    INSERT INTO users (user_id) VALUES ($1)
+    ON CONFLICT (user_id) DO NOTHING
+),
+previous AS (
+    SELECT secret_code, message_id FROM temporary_codes
+    WHERE user_id = $1
+    FOR UPDATE
+),
+issued AS (
+    INSERT INTO temporary_codes AS t (user_id, secret_code, expires_at)
+    SELECT $1, $2::varchar, $4
+    FROM (SELECT count(*) FROM previous) AS locked
+    WHERE NOT EXISTS (SELECT 1 FROM temporary_codes WHERE secret_code = $2::varchar AND user_id <> $1)
+    ON CONFLICT (user_id) DO UPDATE SET
+        secret_code = CASE WHEN t.expires_at > $3::timestamptz + make_interval(secs => $5::float8)
+                           THEN t.secret_code ELSE EXCLUDED.secret_code END,
+        expires_at = CASE WHEN t.expires_at > $3::timestamptz + make_interval(secs => $5::float8) AND NOT $6::boolean
+                          THEN t.expires_at ELSE EXCLUDED.expires_at END,
+        message_id = CASE WHEN t.expires_at > $3::timestamptz + make_interval(secs => $5::float8)
+                          THEN t.message_id END,
+        created_at = CASE WHEN t.expires_at > $3::timestamptz + make_interval(secs => $5::float8)
+                          THEN t.created_at ELSE EXCLUDED.created_at END
+    WHERE EXISTS (SELECT 1 FROM previous)
+    RETURNING secret_code, expires_at
+)
+SELECT i.secret_code, i.expires_at, COALESCE(i.secret_code = p.secret_code, FALSE) AS reused,
+       ARRAY(SELECT secret_code FROM previous)::varchar[] AS stale_codes,
+       ARRAY(SELECT message_id FROM previous)::bigint[] AS stale_message_ids
+FROM issued i
+LEFT JOIN previous p ON TRUE
+UNION ALL
+SELECT NULL, NULL, NULL, NULL, NULL
+WHERE NOT EXISTS (SELECT 1 FROM issued);
+""")
+
+SET_CODE_MESSAGE_IDS = register_query('set_code_message_ids', """
+UPDATE temporary_codes t
+SET message_id = v.message_id
+FROM unnest($1::varchar[], $2::bigint[], $3::bigint[]) AS v(secret_code, user_id, message_id)
+WHERE t.secret_code = v.secret_code AND t.user_id = v.user_id;
+""")
+
+GET_USER_FOR_UPDATE = register_query('get_user_for_update', """
+SELECT name, phone_number, hookah_count, free_hookahs_available, total_spent
+FROM users WHERE user_id = $1 FOR UPDATE;
+""")
+
+UPDATE_USER_BALANCE = register_query('update_user_balance', """
+UPDATE users
+SET total_spent = total_spent + $1,
+    hookah_count = hookah_count + $2,
+    free_hookahs_available = free_hookahs_available - $3 + $4
+WHERE user_id = $5 AND free_hookahs_available >= $3
+RETURNING name, phone_number, total_spent, hookah_count, free_hookahs_available;
+""")
+
+GET_CODE_MESSAGE_ID = register_query('get_code_message_id', """
+SELECT message_id FROM temporary_codes WHERE secret_code = $1 AND user_id = $2;
+""")
+
+DELETE_CODE = register_query('delete_code', """
+DELETE FROM temporary_codes WHERE secret_code = $1 AND user_id = $2;
+""")
+
+INSERT_ADMIN_ACTION = register_query('insert_admin_action', """
+INSERT INTO admin_actions
+(admin_id, admin_name, admin_username, action_type, user_id, client_name, client_phone_number, amount, hookah_count)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9);
+""")
+
+SAVE_USER_NAME = register_query('save_user_name', """
+INSERT INTO users (user_id, name)
+VALUES ($1, $2)
+ON CONFLICT (user_id) DO UPDATE SET
+    name = EXCLUDED.name;
+""")
+
+SAVE_USER_PHONE = register_query('save_user_phone', """
+UPDATE users SET phone_number = $1
+WHERE user_id = $2;
+""")
+
+LIST_CLIENTS = register_query('list_clients', """
+SELECT user_id, name, phone_number, total_spent, hookah_count, free_hookahs_available, registration_date FROM users
+ORDER BY registration_date ASC;
+""")
+
+ESTIMATE_USER_COUNT = register_query('estimate_user_count', """
+SELECT
+    CASE WHEN c.reltuples >= $1 THEN c.reltuples::bigint
+         ELSE (SELECT count(*) FROM users WHERE is_reachable) END AS user_count,
+    c.reltuples >= $1 AS estimated
+FROM pg_class c
+WHERE c.oid = 'idx_users_reachable'::regclass;
+""")
+
+DELETE_EXPIRED_CODES = register_query('delete_expired_codes', """
+DELETE FROM temporary_codes t
+USING users u
+WHERE t.id IN (
+    SELECT id FROM temporary_codes
+    WHERE expires_at < $1
+    ORDER BY expires_at
+    LIMIT $2
+    FOR UPDATE SKIP LOCKED
+) AND u.user_id = t.user_id
+RETURNING t.secret_code, t.user_id, t.message_id, u.is_reachable;
+""")
+
+LIST_CODE_EXPIRIES = register_query('list_code_expiries', """
+SELECT secret_code, user_id, expires_at FROM temporary_codes;
+""")
+
+EXPIRE_CODES = register_query('expire_codes', """
+DELETE FROM temporary_codes t
+USING unnest($1::varchar[], $2::bigint[]) AS v(secret_code, user_id), users u
+WHERE t.secret_code = v.secret_code AND t.user_id = v.user_id AND t.expires_at <= $3 AND u.user_id = t.user_id
+RETURNING t.secret_code, t.user_id, t.message_id, u.is_reachable;
+""")
+
+WAITERS_REPORT = register_query('waiters_report', """
+SELECT
+    DATE(aa.action_date AT TIME ZONE 'UTC') as report_date,
+    aa.admin_id,
+    COALESCE(aa.admin_name, aa.admin_username, aa.admin_id::text) as admin_display_name,
+    COUNT(DISTINCT CASE WHEN aa.action_type = 'user_registered' THEN aa.user_id END) as new_users_registered_today,
+    COALESCE(SUM(CASE WHEN aa.action_type = 'transaction' THEN aa.amount ELSE 0 END), 0) as total_amount_today
+FROM admin_actions aa
+WHERE aa.admin_id = ANY($1::bigint[])
+  AND ($2::date IS NULL OR (aa.action_date AT TIME ZONE 'UTC')::date >= $2::date)
+  AND ($3::date IS NULL OR (aa.action_date AT TIME ZONE 'UTC')::date <= $3::date)
+GROUP BY report_date, aa.admin_id, admin_display_name
+ORDER BY report_date DESC, admin_display_name ASC;
+""")
+
+SERVICED_CLIENTS_REPORT = register_query('serviced_clients_report', """
+SELECT
+    (aa.action_date AT TIME ZONE 'UTC')::date as report_date,
+    COALESCE(aa.client_name, 'N/A') as client_name,
+    COALESCE(aa.client_phone_number, 'N/A') as client_phone_number,
+    aa.amount as check_amount,
+    aa.hookah_count as ordered_hookahs,
+    COALESCE(aa.admin_name, aa.admin_username, aa.admin_id::text) as admin_display_name
+FROM admin_actions aa
+WHERE aa.action_type = 'transaction'
+  AND ($1::date IS NULL OR (aa.action_date AT TIME ZONE 'UTC')::date >= $1::date)
+  AND ($2::date IS NULL OR (aa.action_date AT TIME ZONE 'UTC')::date <= $2::date)
+ORDER BY aa.action_date DESC;
+""")
+
+
+CREATE_BROADCAST_JOB = register_query('create_broadcast_job', """
+INSERT INTO broadcast_jobs (admin_id, content_type, text, photo_id, total)
+VALUES ($1, $2, $3, $4, $5)
+RETURNING id, total;
+""")
+
+GET_BROADCAST_JOB = register_query('get_broadcast_job', """
+SELECT id, admin_id, content_type, text, photo_id, status, total, sent, failed, created_at, finished_at
+FROM broadcast_jobs WHERE id = $1;
+""")
+
+LIST_BROADCAST_JOBS = register_query('list_broadcast_jobs', """
+SELECT id, status, total, sent, failed, created_at
+FROM broadcast_jobs ORDER BY id DESC LIMIT $1;
+""")
+
+LIST_RUNNING_BROADCAST_JOBS = register_query('list_running_broadcast_jobs', """
+SELECT id FROM broadcast_jobs WHERE status = 'running' ORDER BY id;
+""")
+
+SET_BROADCAST_JOB_STATUS = register_query('set_broadcast_job_status', """
+UPDATE broadcast_jobs
+SET status = $2,
+    finished_at = CASE WHEN $2 IN ('completed', 'cancelled') THEN now() ELSE finished_at END,
+    total = CASE WHEN $2 = 'completed' THEN sent + failed ELSE total END
+WHERE id = $1 AND status = ANY($3::text[])
+RETURNING id, status, total;
+""")
+
+RELEASE_BROADCAST_CLAIMS = register_query('release_broadcast_claims', """
+UPDATE broadcast_deliveries SET status = 'pending'
+WHERE job_id = $1 AND status = 'sending';
+""")
+
+CLAIM_BROADCAST_DELIVERIES = register_query('claim_broadcast_deliveries', """
+WITH page AS (
+    SELECT user_id FROM users
+    WHERE is_reachable AND user_id > $3
+    ORDER BY user_id
+    LIMIT $2
+),
+claimed AS (
+    INSERT INTO broadcast_deliveries (job_id, user_id, status, updated_at)
+    SELECT $1, user_id, 'sending', now() FROM page
+    ON CONFLICT (job_id, user_id) DO NOTHING
+    RETURNING user_id
+)
+SELECT (SELECT max(user_id) FROM page) AS next_cursor,
+       ARRAY(SELECT user_id FROM claimed ORDER BY user_id)::bigint[] AS user_ids;
+""")
+
+CLAIM_RELEASED_BROADCAST_DELIVERIES = register_query('claim_released_broadcast_deliveries', """
+UPDATE broadcast_deliveries d
+SET status = 'sending', updated_at = now()
+FROM (
+    SELECT job_id, user_id FROM broadcast_deliveries
+    WHERE job_id = $1 AND status = 'pending'
+    ORDER BY user_id
+    LIMIT $2
+    FOR UPDATE SKIP LOCKED
+) claimed
+WHERE d.job_id = claimed.job_id AND d.user_id = claimed.user_id
+RETURNING d.user_id;
+""")
+
+RECORD_BROADCAST_DELIVERIES = register_query('record_broadcast_deliveries', """
+WITH recorded AS (
+    UPDATE broadcast_deliveries d
+    SET status = v.status, error = v.error, updated_at = now()
+    FROM unnest($2::bigint[], $3::text[], $4::text[]) AS v(user_id, status, error)
+    WHERE d.job_id = $1 AND d.user_id = v.user_id AND d.status = 'sending'
+    RETURNING d.user_id, d.status, d.error
+),
+unreachable AS (
+    UPDATE users u
+    SET is_reachable = FALSE, unreachable_since = now(), unreachable_reason = r.error
+    FROM recorded r
+    WHERE u.user_id = r.user_id AND r.status = 'unreachable' AND u.is_reachable
+)
+UPDATE broadcast_jobs
+SET sent = sent + (SELECT count(*) FROM recorded WHERE status = 'sent'),
+    failed = failed + (SELECT count(*) FROM recorded WHERE status <> 'sent')
+WHERE id = $1
+RETURNING sent, failed;
+""")
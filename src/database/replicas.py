@@ -0,0 +1,53 @@
+import asyncio
+from typing import TypedDict
+from urllib.parse import urlsplit
+
+import asyncpg
+
+REPLICA_CONNECT_TIMEOUT = 5
+
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END;
+"""
+
+REPLICA_CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+)
+
+
+class ReplicaStats(TypedDict):
+    label: str
+    healthy: bool
+    lag_seconds: float | None
+
+
+class Replica:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        parts = urlsplit(dsn)
+        self.label = f"{parts.hostname}:{parts.port or 5432}" if parts.hostname else "replica"
+        self.pool = None
+        self.healthy = False
+        self.lag_seconds: float | None = None
+        self.checked_at = 0.0
+        self.refresh_lock = asyncio.Lock()
+
+    def mark_failed(self, checked_at: float):
+        self.healthy = False
+        self.lag_seconds = None
+        self.checked_at = checked_at
+
+    def stats(self) -> ReplicaStats:
+        return ReplicaStats(
+            label=self.label,
+            healthy=self.healthy,
+            lag_seconds=round(self.lag_seconds, 2) if self.lag_seconds is not None else None
+        )
@@ -0,0 +1,103 @@
+import asyncio
+import random
+import time
+from typing import TypedDict
+
+import asyncpg
+
+TRANSIENT_DB_ERRORS = (
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.AdminShutdownError,
+    asyncpg.CrashShutdownError,
+    asyncpg.TooManyConnectionsError,
+)
+
+BREAKER_FAILURE_ERRORS = TRANSIENT_DB_ERRORS + (asyncio.TimeoutError,)
+
+
+class BreakerStats(TypedDict):
+    state: str
+    consecutive_failures: int
+    failure_threshold: int
+    times_opened: int
+    rejected: int
+    retries: int
+    open_for_seconds: float | None
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self.retries = 0
+        self._opened_at: float | None = None
+        self._probe_started_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if self.failure_threshold <= 0 or state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            now = time.monotonic()
+            if self._probe_started_at is None or now - self._probe_started_at >= self.reset_timeout:
+                self._probe_started_at = now
+                return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+
+    def record_failure(self) -> bool:
+        self.consecutive_failures += 1
+        if self.failure_threshold <= 0:
+            return False
+        state = self.state
+        if state == self.HALF_OPEN or (state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self._opened_at = time.monotonic()
+            self._probe_started_at = None
+            self.times_opened += 1
+            return True
+        return False
+
+    def stats(self) -> BreakerStats:
+        open_for = time.monotonic() - self._opened_at if self._opened_at is not None else None
+        return BreakerStats(
+            state=self.state,
+            consecutive_failures=self.consecutive_failures,
+            failure_threshold=self.failure_threshold,
+            times_opened=self.times_opened,
+            rejected=self.rejected,
+            retries=self.retries,
+            open_for_seconds=round(open_for, 1) if open_for is not None else None
+        )
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int, base_delay: float, max_delay: float):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
@@ -0,0 +1,16 @@
+class UnitOfWork:
+    def __init__(self, manager, conn):
+        self._manager = manager
+        self.connection = conn
+
+    async def execute(self, query, *args):
+        return await self._manager._run_query(self.connection, 'execute', query, args)
+
+    async def execute_returning(self, query, *args):
+        return await self._manager._run_query(self.connection, 'fetchrow', query, args)
+
+    async def fetch_one(self, query, *args):
+        return await self._manager._run_query(self.connection, 'fetchrow', query, args)
+
+    async def fetch_all(self, query, *args):
+        return await self._manager._run_query(self.connection, 'fetch', query, args)
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 
 from aiogram import Router, Bot, F
@@ -8,12 +7,16 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from src.filters.super_admin_filter import SuperAdminFilter
-from src.logic.admin_logic import get_all_user_ids
-from src.utils.keyboards import get_admin_panel_keyboard, get_goto_admin_panel, get_broadcast_confirmation_keyboard
+from src.logic.admin_logic import count_broadcast_recipients
+from src.logic.broadcast import BroadcastContent
+from src.logic.broadcast_jobs import ProgressMessage, broadcast_jobs
+from src.utils.keyboards import get_admin_panel_keyboard, get_goto_admin_panel, get_broadcast_confirmation_keyboard, \
+    get_broadcast_jobs_keyboard, get_broadcast_job_keyboard
 from src.utils.messages import get_message
 from src.utils.tg_utils import safe_delete_message
 
 logger = logging.getLogger(__name__)
+BROADCAST_JOBS_LIST_LIMIT = 10
 router = Router()
 router.message.filter(SuperAdminFilter())
 router.callback_query.filter(SuperAdminFilter())
@@ -89,15 +92,16 @@ async def handle_broadcast_content(message: Message, state: FSMContext, bot: Bot
         original_content_message_id=message.message_id
     )
 
-    user_ids = await get_all_user_ids()
-    user_count = len(user_ids) if user_ids is not None else 0
+    recipients = await count_broadcast_recipients()
 
-    if user_ids is None:
+    if recipients is None:
         await message.answer(get_message('admin_panel.broadcast_user_fetch_error'), reply_markup=get_goto_admin_panel())
         await safe_delete_message(bot, chat_id, message.message_id)
         await state.clear()
         return
 
+    await state.update_data(broadcast_recipient_count=recipients['count'])
+    user_count = f"~{recipients['count']}" if recipients['estimated'] else recipients['count']
     confirm_prompt_text = get_message('admin_panel.confirm_broadcast_prompt', user_count=user_count)
 
     preview_message = None
@@ -166,67 +170,120 @@ async def handle_broadcast_confirm(callback: CallbackQuery, state: FSMContext, b
     await safe_delete_message(bot, chat_id, preview_message_id)
     await safe_delete_message(bot, chat_id, confirm_message_id)
 
-    await bot.send_message(chat_id=chat_id, text=get_message('admin_panel.broadcast_started'), reply_markup=get_goto_admin_panel())
     await callback.answer()
 
-    user_ids = await get_all_user_ids()
-    if user_ids is None:
-        logger.error(f"Failed to get user IDs again before starting broadcast for admin {admin_id}")
-        await bot.send_message(chat_id, get_message('admin_panel.broadcast_user_fetch_error'), reply_markup=get_goto_admin_panel())
+    content = BroadcastContent(
+        content_type=state_data.get('broadcast_content_type'),
+        text=state_data.get('broadcast_text'),
+        photo_id=state_data.get('broadcast_photo_id')
+    )
+    job = await broadcast_jobs.create_job(admin_id, content, state_data.get('broadcast_recipient_count', 0))
+    if job is None:
+        await bot.send_message(chat_id, get_message('admin_panel.broadcast_start_error'), reply_markup=get_goto_admin_panel())
         await state.clear()
         return
-    if not user_ids:
-         logger.warning(f"No users found to broadcast to for admin {admin_id}")
-         await bot.send_message(chat_id, get_message('admin_panel.broadcast_no_users'), reply_markup=get_goto_admin_panel())
-         await state.clear()
-         return
-
-
-    content_type = state_data.get('broadcast_content_type')
-    text = state_data.get('broadcast_text')
-    photo_id = state_data.get('broadcast_photo_id')
-
-    success_count = 0
-    fail_count = 0
-    total_users = len(user_ids)
-
-    logger.info(f"Starting broadcast by admin {admin_id} to {total_users} users. Content type: {content_type}")
-
-    for i, user_id in enumerate(user_ids):
-        try:
-            if content_type == 'text':
-                await bot.send_message(user_id, text, parse_mode='HTML', disable_web_page_preview=True)
-            elif content_type == 'photo':
-                await bot.send_photo(user_id, photo_id, caption=text, parse_mode='HTML')
-
-            success_count += 1
-            logger.debug(f"Broadcast message sent successfully to user {user_id}")
-        except TelegramAPIError as e:
-            fail_count += 1
-            if "bot was blocked by the user" in e.message or \
-               "user is deactivated" in e.message or \
-               "chat not found" in e.message or \
-               "user not found" in e.message:
-                logger.warning(f"Broadcast failed for user {user_id} (Blocked/Deactivated/Not Found): {e.message}")
-            else:
-                logger.error(f"TelegramAPIError sending broadcast to {user_id}: {e}", exc_info=True)
-        except Exception as e:
-            fail_count += 1
-            logger.error(f"Unexpected error sending broadcast to user {user_id}: {e}", exc_info=True)
-
-        if i % 20 == 0:
-             await asyncio.sleep(1)
-        else:
-             await asyncio.sleep(0.05)
-
-
-    result_message = get_message(
-        'admin_panel.broadcast_success',
-        success_count=success_count,
-        fail_count=fail_count,
-        total_users=total_users
-    )
-    await bot.send_message(chat_id=chat_id, text=result_message, reply_markup=get_goto_admin_panel())
-    logger.info(f"Broadcast finished. {success_count}/{total_users} sent, {fail_count} failed.")
+    if not job['total']:
+        logger.warning(f"No users found to broadcast to for admin {admin_id}")
+        await broadcast_jobs.set_status(bot, job['id'], 'cancel')
+        await bot.send_message(chat_id, get_message('admin_panel.broadcast_no_users'), reply_markup=get_goto_admin_panel())
+        await state.clear()
+        return
+
+    logger.info(f"Starting broadcast job {job['id']} by admin {admin_id} to {job['total']} users. "
+                f"Content type: {content.content_type}")
+    progress_message = None
+    try:
+        started_message = await bot.send_message(
+            chat_id=chat_id,
+            text=get_message('admin_panel.broadcast_started', job_id=job['id'], total=job['total']),
+            reply_markup=get_goto_admin_panel()
+        )
+        progress_message = ProgressMessage(started_message.chat.id, started_message.message_id)
+    except Exception as e:
+        logger.error(f"Failed to send start message for broadcast job {job['id']} to admin {admin_id}: {e}", exc_info=True)
+    broadcast_jobs.start(bot, job['id'], progress_message)
+    await state.clear()
+
+
+def _format_job_time(moment) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M') if moment else 'N/A'
+
+
+@router.callback_query(F.data == "admin:broadcast_jobs")
+async def handle_broadcast_jobs(callback: CallbackQuery, bot: Bot):
+    message = callback.message
+    if not message:
+        await callback.answer("Помилка: не вдалося знайти повідомлення.", show_alert=True)
+        return
+
+    admin_id = callback.from_user.id
+    logger.info(f"Admin {admin_id} requested broadcast jobs.")
+
+    jobs = await broadcast_jobs.list_jobs(BROADCAST_JOBS_LIST_LIMIT)
+    if jobs is None:
+        await callback.answer(get_message('admin_panel.internal_error'), show_alert=True)
+        return
 
-    await state.clear()
\ No newline at end of file
+    if jobs:
+        text = get_message('admin_panel.broadcast_jobs_header') + "".join(
+            get_message(
+                'admin_panel.broadcast_jobs_line',
+                id=job['id'],
+                status=get_message(f"admin_panel.broadcast_job_status_{job['status']}"),
+                done=job['sent'] + job['failed'],
+                total=job['total'],
+                failed=job['failed'],
+                created_at=_format_job_time(job['created_at'])
+            )
+            for job in jobs
+        )
+    else:
+        text = get_message('admin_panel.broadcast_jobs_empty')
+
+    try:
+        await message.edit_text(text, reply_markup=get_broadcast_jobs_keyboard(jobs), parse_mode='HTML')
+    except TelegramAPIError as e:
+        logger.warning(f"Could not show broadcast jobs to admin {admin_id}: {e}")
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("broadcast_job:"))
+async def handle_broadcast_job(callback: CallbackQuery, bot: Bot):
+    message = callback.message
+    if not message:
+        await callback.answer("Помилка: не вдалося знайти повідомлення.", show_alert=True)
+        return
+
+    admin_id = callback.from_user.id
+    _, action, job_id = callback.data.split(':')
+    job_id = int(job_id)
+
+    action_failed = False
+    if action != 'view':
+        logger.info(f"Admin {admin_id} requested {action} for broadcast job {job_id}.")
+        action_failed = await broadcast_jobs.set_status(bot, job_id, action) is None
+
+    job = await broadcast_jobs.get_job(job_id)
+    if job is None:
+        await callback.answer(get_message('admin_panel.broadcast_job_not_found'), show_alert=True)
+        return
+
+    text = get_message(
+        'admin_panel.broadcast_job_details',
+        id=job['id'],
+        status=get_message(f"admin_panel.broadcast_job_status_{job['status']}"),
+        sent=job['sent'],
+        failed=job['failed'],
+        pending=max(0, job['total'] - job['sent'] - job['failed']),
+        total=job['total'],
+        created_at=_format_job_time(job['created_at'])
+    )
+    try:
+        await message.edit_text(text, reply_markup=get_broadcast_job_keyboard(job['id'], job['status']),
+                                parse_mode='HTML')
+    except TelegramAPIError as e:
+        logger.warning(f"Could not show broadcast job {job_id} to admin {admin_id}: {e}")
+    if action_failed:
+        await callback.answer(get_message('admin_panel.broadcast_job_action_failed'), show_alert=True)
+    else:
+        await callback.answer()
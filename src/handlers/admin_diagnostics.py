@@ -0,0 +1,116 @@
+import html
+import logging
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from src.config import settings
+from src.logic.admin_logic import get_token_resolution_stats
+from src.database.manager import db_manager
+from src.filters.super_admin_filter import SuperAdminFilter
+from src.logic.code_expiry import code_expiry
+from src.logic.code_messages import code_message_writer
+from src.logic.code_pool import code_pool
+from src.logic.token_cache import token_cache
+from src.utils.keyboards import get_goto_admin_panel
+from src.utils.messages import get_message
+from src.utils.qr_generator import qr_render_pool
+
+logger = logging.getLogger(__name__)
+STATS_ENTRIES_LIMIT = 10
+FINGERPRINT_DISPLAY_LENGTH = 160
+router = Router()
+router.message.filter(SuperAdminFilter())
+
+
+@router.message(Command("db_stats"))
+async def handle_db_stats_command(message: Message):
+    admin_id = message.from_user.id
+    logger.info(f"SuperAdmin {admin_id} requested database pool stats.")
+
+    replicas_section = "".join(
+        get_message(
+            'admin_panel.db_stats_replica_line',
+            label=replica['label'],
+            status=get_message('admin_panel.db_stats_replica_healthy' if replica['healthy']
+                               else 'admin_panel.db_stats_replica_unhealthy'),
+            lag=f"{replica['lag_seconds']}s" if replica['lag_seconds'] is not None else "N/A"
+        )
+        for replica in db_manager.get_replica_stats()
+    )
+
+    breaker_stats = db_manager.get_breaker_stats()
+    breaker_state = get_message(
+        f"admin_panel.db_stats_breaker_{breaker_stats['state']}", open_for_seconds=breaker_stats['open_for_seconds'])
+
+    pool_stats = db_manager.get_pool_stats()
+    stats_text = get_message(
+        'admin_panel.db_stats',
+        replicas_section=replicas_section,
+        breaker_state=breaker_state,
+        consecutive_failures=breaker_stats['consecutive_failures'],
+        failure_threshold=breaker_stats['failure_threshold'],
+        times_opened=breaker_stats['times_opened'],
+        rejected=breaker_stats['rejected'],
+        retries=breaker_stats['retries'],
+        **pool_stats
+    )
+    await message.answer(stats_text, parse_mode='HTML', reply_markup=get_goto_admin_panel())
+
+
+def _format_fingerprint(fingerprint: str) -> str:
+    if len(fingerprint) > FINGERPRINT_DISPLAY_LENGTH:
+        fingerprint = fingerprint[:FINGERPRINT_DISPLAY_LENGTH] + "…"
+    return html.escape(fingerprint)
+
+
+@router.message(Command("db_queries"))
+async def handle_db_queries_command(message: Message):
+    admin_id = message.from_user.id
+    logger.info(f"SuperAdmin {admin_id} requested query latency stats.")
+
+    query_stats = db_manager.get_query_stats(limit=STATS_ENTRIES_LIMIT)
+    if not query_stats:
+        await message.answer(get_message('admin_panel.db_queries_empty'), reply_markup=get_goto_admin_panel())
+        return
+
+    stats_text = get_message('admin_panel.db_queries_header') + "".join(
+        get_message('admin_panel.db_queries_line', **{**stats, 'fingerprint': _format_fingerprint(stats['fingerprint'])})
+        for stats in query_stats
+    )
+    await message.answer(stats_text, parse_mode='HTML', reply_markup=get_goto_admin_panel())
+
+
+@router.message(Command("db_slow"))
+async def handle_db_slow_command(message: Message):
+    admin_id = message.from_user.id
+    logger.info(f"SuperAdmin {admin_id} requested slow query log.")
+
+    slow_queries = db_manager.get_slow_queries()[-STATS_ENTRIES_LIMIT:]
+    if not slow_queries:
+        await message.answer(get_message('admin_panel.db_slow_empty'), reply_markup=get_goto_admin_panel())
+        return
+
+    slow_text = get_message('admin_panel.db_slow_header', threshold_ms=settings.db_slow_query_threshold_ms) + "".join(
+        get_message(
+            'admin_panel.db_slow_line',
+            recorded_at=entry['recorded_at'].strftime('%Y-%m-%d %H:%M:%S'),
+            duration_ms=entry['duration_ms'],
+            rows=entry['rows'],
+            fingerprint=_format_fingerprint(entry['fingerprint'])
+        )
+        for entry in reversed(slow_queries)
+    )
+    await message.answer(slow_text, parse_mode='HTML', reply_markup=get_goto_admin_panel())
+
+
+@router.message(Command("qr_stats"))
+async def handle_qr_stats_command(message: Message):
+    admin_id = message.from_user.id
+    logger.info(f"SuperAdmin {admin_id} requested QR render stats.")
+
+    stats_text = get_message('admin_panel.qr_stats', **qr_render_pool.stats(), **code_pool.stats(),
+                             **code_message_writer.stats(), **code_expiry.stats(),
+                             **token_cache.stats(), **get_token_resolution_stats())
+    await message.answer(stats_text, parse_mode='HTML', reply_markup=get_goto_admin_panel())
@@ -75,22 +75,12 @@ async def handle_token_input(message: Message, state: FSMContext, bot: Bot):
 
     logger.info(f"Admin {admin_id} entered token: {entered_token}")
 
-    token_info = await admin_logic.validate_token(entered_token)
+    token_info = await admin_logic.resolve_token(entered_token)
 
     if token_info:
         client_user_id = token_info['user_id']
-        logger.info(f"Token {entered_token} is valid for user {client_user_id}.")
-
-        user_initial_data = await admin_logic.get_user_initial_data(client_user_id)
-
-        if not user_initial_data:
-            logger.error(f"Token {entered_token} valid for user {client_user_id}, but user data not found.")
-            await message.answer(get_message('admin_panel.internal_error'), reply_markup=get_goto_admin_panel())
-            await state.clear()
-            return
-
-        available_free_hookahs = user_initial_data.get('free_hookahs_available', 0)
-        user_name = user_initial_data.get('name', 'Клієнт')
+        available_free_hookahs = token_info['free_hookahs_available'] or 0
+        user_name = token_info['name'] or 'Клієнт'
 
         await safe_delete_message(bot, chat_id, message.message_id)
         await safe_delete_message(bot, chat_id, original_prompt_message_id)
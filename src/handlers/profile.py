@@ -8,6 +8,7 @@ from typing import TypedDict, Optional
 from src.utils.messages import get_message
 from src.utils.keyboards import get_goto_main_menu
 from src.utils.progress_bar import generate_progress_bar
+from src.database import queries
 from src.database.manager import db_manager
 from src.logic.profile_logic import calculate_profile_metrics
 from src.config import settings
@@ -23,10 +24,7 @@ class UserProfileData(TypedDict):
 
 async def get_user_profile_data(user_id: int) -> Optional[UserProfileData]:
     try:
-        user_record = await db_manager.fetch_one(
-            "SELECT name, total_spent, hookah_count, free_hookahs_available FROM users WHERE user_id = $1",
-            user_id
-        )
+        user_record = await db_manager.fetch_one_readonly(queries.GET_USER_PROFILE, user_id)
         if user_record:
             return UserProfileData(
                 name=user_record['name'],
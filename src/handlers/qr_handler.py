@@ -4,10 +4,11 @@ from aiogram.exceptions import TelegramAPIError
 from aiogram.types import CallbackQuery, Message
 
 from src.utils.messages import get_message
-from src.utils.qr_generator import generate_qr_code_inputfile
-from src.database.manager import db_manager
-from src.logic.qr_logic import generate_and_store_temporary_code
-from src.config import settings
+from src.utils.qr_generator import generate_qr_code_inputfile, build_qr_inputfile, qr_photo_cache
+from src.utils.tg_utils import safe_delete_message
+from src.logic.code_messages import code_message_writer
+from src.logic.code_pool import code_pool
+from src.logic.qr_logic import issue_temporary_code
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -23,75 +24,66 @@ async def handle_generate_user_qr(callback: CallbackQuery, bot: Bot):
     chat_id = message.chat.id
     user_id = callback.from_user.id
 
+    pregenerated = code_pool.take()
+    spent = False
     try:
-        sql_ensure_user = """
-        INSERT INTO users (user_id) VALUES ($1)
-        ON CONFLICT (user_id) DO NOTHING;
-        """
-        ensure_result = await db_manager.execute(sql_ensure_user, user_id)
-        if ensure_result and 'INSERT 0 1' in ensure_result:
-            logger.warning(f"User {user_id} already exists in the database.")
-        elif ensure_result is None:
-            await callback.answer("Помилка бази даних. Спробуйте пізніше.", show_alert=True)
-            return
-    except Exception as e:
-        logger.error(f"Error ensuring user {user_id} in the database: {e}", exc_info=True)
-        await callback.answer("Помилка перевірки користувача. Спробуйте пізніше.", show_alert=True)
-        return
+        issued = await issue_temporary_code(user_id, secret_code=pregenerated.secret_code if pregenerated else None)
 
-    secret_code = await generate_and_store_temporary_code(user_id)
+        if not issued:
+            await callback.answer("Can't generate QR code. Try again later.", show_alert=True)
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+            except TelegramAPIError:
+                pass
+            return
 
-    if not secret_code:
-        await callback.answer("Can't generate QR code. Try again later.", show_alert=True)
-        try:
-            await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
-        except TelegramAPIError:
-            pass
-        return
+        secret_code = issued['secret_code']
+        if pregenerated and pregenerated.secret_code != secret_code and not issued['reused']:
+            spent = True
 
-    qr_data = secret_code
-    qr_input_file = await generate_qr_code_inputfile(qr_data)
+        cached_file_id = qr_photo_cache.get(secret_code) if issued['reused'] else None
+        if cached_file_id:
+            qr_photo = cached_file_id
+        elif pregenerated and pregenerated.secret_code == secret_code:
+            qr_photo = build_qr_inputfile(pregenerated.png)
+        else:
+            qr_photo = await generate_qr_code_inputfile(secret_code)
 
-    if not qr_input_file:
-        await callback.answer("Can't generate QR code. Try again later.", show_alert=True)
-        try:
-            await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
-        except TelegramAPIError:
-            pass
-        return
-
-    try:
-        ttl_minutes = settings.qr_code_ttl_seconds // 60
-        sent_message = await bot.send_photo(
-            chat_id=chat_id,
-            photo=qr_input_file,
-            caption=get_message('qr_handler.qr_caption', ttl_minutes=ttl_minutes),
-            parse_mode='HTML'
-        )
-        await callback.answer()
-        await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
-    except Exception as e:
-        logger.error(f"Error sending QR Code for user {user_id} in chat {chat_id}: {e}", exc_info=True)
-        try:
-             await callback.answer("Не вдалося надіслати QR-код.", show_alert=True)
-        except:
-             pass
+        if not qr_photo:
+            await callback.answer("Can't generate QR code. Try again later.", show_alert=True)
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+            except TelegramAPIError:
+                pass
+            return
 
-    if sent_message:
+        sent_message = None
         try:
-            sql_update_message_id = """
-            UPDATE temporary_codes SET message_id = $1
-            WHERE secret_code = $2 AND user_id = $3;
-            """
-            update_result = await db_manager.execute(
-                sql_update_message_id,
-                sent_message.message_id,
-                secret_code,
-                user_id
+            ttl_minutes = max(1, issued['ttl_seconds'] // 60)
+            sent_message = await bot.send_photo(
+                chat_id=chat_id,
+                photo=qr_photo,
+                caption=get_message('qr_handler.qr_caption', ttl_minutes=ttl_minutes),
+                parse_mode='HTML'
             )
-            if update_result:
-                logger.info(f"Successfully stored message_id {sent_message.message_id} for code {secret_code} user {user_id}.")
-            else:
-                logger.warning(f"Could not store message_id for code {secret_code} user {user_id}. Update result: {update_result}")
+            await callback.answer()
+            await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
         except Exception as e:
-            logger.error(f"Failed to store message_id {sent_message.message_id} for code {secret_code} user {user_id}: {e}",exc_info=True)
\ No newline at end of file
+            logger.error(f"Error sending QR Code for user {user_id} in chat {chat_id}: {e}", exc_info=True)
+            try:
+                 await callback.answer("Не вдалося надіслати QR-код.", show_alert=True)
+            except:
+                 pass
+
+        if sent_message:
+            if pregenerated and pregenerated.secret_code == secret_code:
+                spent = True
+            code_message_writer.put(secret_code, user_id, sent_message.message_id)
+            if sent_message.photo:
+                qr_photo_cache.put(secret_code, sent_message.photo[-1].file_id, issued['ttl_seconds'])
+            for stale_message_id in issued['stale_message_ids']:
+                if stale_message_id != sent_message.message_id:
+                    await safe_delete_message(bot, chat_id, stale_message_id)
+    finally:
+        if pregenerated and not spent:
+            code_pool.put_back(pregenerated)
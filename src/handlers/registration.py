@@ -4,6 +4,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, ReplyKeyboardRemove
 from src.utils.messages import get_message
+from src.database import queries
 from src.database.manager import db_manager
 from src.logic.registration_logic import save_user_name, save_user_phone
 from src.utils.keyboards import get_phone_keyboard, get_goto_main_menu
@@ -20,9 +21,11 @@ class RegistationStates(StatesGroup):
 
 @router.message(CommandStart())
 async def handle_start(message: Message, state: FSMContext):
-    existing_user = await db_manager.fetch_one("SELECT user_id FROM users WHERE user_id = $1", message.from_user.id)
+    existing_user = await db_manager.execute_returning(queries.START_USER, message.from_user.id)
     if existing_user:
         logger.info(f"User {message.from_user.id} already registered.")
+        if existing_user['restored']:
+            logger.info(f"User {message.from_user.id} is reachable again, resuming broadcasts to them.")
         await state.clear()
         await show_main_menu(message)
         return
@@ -9,7 +9,9 @@ from aiogram import Bot
 from aiogram.types import BufferedInputFile
 
 from src.config import settings
+from src.database import queries
 from src.database.manager import db_manager
+from src.database.unit_of_work import UnitOfWork
 from src.utils.keyboards import get_goto_admin_panel
 from src.utils.messages import get_message
 
@@ -25,26 +27,25 @@ async def log_admin_action(
         client_name: Optional[str] = None,
         client_phone_number: Optional[str] = None,
         amount: Optional[Decimal] = None,
-        hookah_count: Optional[int] = None
+        hookah_count: Optional[int] = None,
+        uow: Optional[UnitOfWork] = None
 ) -> None:
-    query = """
-    INSERT INTO admin_actions
-    (admin_id, admin_name, admin_username, action_type, user_id, client_name, client_phone_number, amount, hookah_count)
-    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-    """
+    params = (
+        admin_id,
+        admin_name,
+        admin_username,
+        action_type,
+        user_id,
+        client_name,
+        client_phone_number,
+        float(amount) if amount is not None else None,
+        hookah_count
+    )
+    if uow is not None:
+        await uow.execute(queries.INSERT_ADMIN_ACTION, *params)
+        return
     try:
-        await db_manager.execute(
-            query,
-            admin_id,
-            admin_name,
-            admin_username,
-            action_type,
-            user_id,
-            client_name,
-            client_phone_number,
-            float(amount) if amount is not None else None,
-            hookah_count
-        )
+        await db_manager.execute(queries.INSERT_ADMIN_ACTION, *params)
     except Exception as e:
         logger.error(f"Failed to log admin action: {e}", exc_info=True)
 
@@ -58,40 +59,9 @@ async def generate_waiters_report_csv(start_date_filter: Optional[date] = None,
             "No regular admin IDs found for waiters report. Only super admins exist or no admins are configured.")
         return "Немає даних: звичайні адміністратори не налаштовані."
 
-    base_query = """
-    SELECT
-        DATE(aa.action_date AT TIME ZONE 'UTC') as report_date,
-        aa.admin_id,
-        COALESCE(aa.admin_name, aa.admin_username, aa.admin_id::text) as admin_display_name,
-        COUNT(DISTINCT CASE WHEN aa.action_type = 'user_registered' THEN aa.user_id END) as new_users_registered_today,
-        COALESCE(SUM(CASE WHEN aa.action_type = 'transaction' THEN aa.amount ELSE 0 END), 0) as total_amount_today
-    FROM admin_actions aa
-    WHERE aa.admin_id = ANY($1::bigint[])
-    """
-    params: list = [regular_admin_ids]
-
-    date_conditions = []
-    param_idx = 2
-
-    if start_date_filter:
-        date_conditions.append(f"(aa.action_date AT TIME ZONE 'UTC')::date >= ${param_idx}")
-        params.append(start_date_filter)
-        param_idx += 1
-    if end_date_filter:
-        date_conditions.append(f"(aa.action_date AT TIME ZONE 'UTC')::date <= ${param_idx}")
-        params.append(end_date_filter)
-        param_idx += 1
-
-    if date_conditions:
-        base_query += " AND " + " AND ".join(date_conditions)
-
-    query = base_query + """
-    GROUP BY report_date, aa.admin_id, admin_display_name
-    ORDER BY report_date DESC, admin_display_name ASC;
-    """
-
     try:
-        records = await db_manager.fetch_all(query, *params)
+        records = await db_manager.fetch_all_readonly(
+            queries.WAITERS_REPORT, regular_admin_ids, start_date_filter, end_date_filter)
 
         if not records:
             logger.info(
@@ -194,43 +164,7 @@ async def send_waiters_report(bot: Bot, chat_id: int, start_date: Optional[date]
 
 async def generate_serviced_clients_report_csv(start_date_filter: Optional[date] = None,
                                                end_date_filter: Optional[date] = None) -> str | None:
-    base_query = """
-    SELECT
-        (aa.action_date AT TIME ZONE 'UTC')::date as report_date,
-        COALESCE(aa.client_name, 'N/A') as client_name,
-        COALESCE(aa.client_phone_number, 'N/A') as client_phone_number,
-        aa.amount as check_amount,
-        aa.hookah_count as ordered_hookahs,
-        COALESCE(aa.admin_name, aa.admin_username, aa.admin_id::text) as admin_display_name
-    FROM admin_actions aa
-    WHERE aa.action_type = 'transaction'
-    """
-    params: list = []
-    param_idx = 1
-
-    date_conditions = []
-    if start_date_filter:
-        date_conditions.append(f"(aa.action_date AT TIME ZONE 'UTC')::date >= ${param_idx}")
-        params.append(start_date_filter)
-        param_idx += 1
-    if end_date_filter:
-        date_conditions.append(f"(aa.action_date AT TIME ZONE 'UTC')::date <= ${param_idx}")
-        params.append(end_date_filter)
-        param_idx += 1
-
-    if date_conditions:
-        base_query += " AND " + " AND ".join(date_conditions)
-
-    query = base_query + " ORDER BY aa.action_date DESC;"
-
     try:
-        records = await db_manager.fetch_all(query, *params)
-
-        if not records:
-            logger.info(
-                f"No serviced client transactions found for the period. Start: {start_date_filter}, End: {end_date_filter}")
-            return None
-
         output = io.StringIO()
         fieldnames = [
             'Дата',
@@ -242,8 +176,11 @@ async def generate_serviced_clients_report_csv(start_date_filter: Optional[date]
         ]
         writer = csv.DictWriter(output, fieldnames=fieldnames, delimiter=',', lineterminator='\n')
         writer.writeheader()
+        records_written = 0
 
-        for record in records:
+        async for record in db_manager.stream(
+                queries.SERVICED_CLIENTS_REPORT, start_date_filter, end_date_filter, readonly=True):
+            records_written += 1
             writer.writerow({
                 'Дата': record['report_date'].strftime('%Y-%m-%d') if record['report_date'] else 'N/A',
                 'Ім\'я клієнта': record['client_name'],
@@ -255,10 +192,16 @@ async def generate_serviced_clients_report_csv(start_date_filter: Optional[date]
                 'Обслуговував адмін': record['admin_display_name']
             })
 
+        if not records_written:
+            output.close()
+            logger.info(
+                f"No serviced client transactions found for the period. Start: {start_date_filter}, End: {end_date_filter}")
+            return None
+
         csv_content = output.getvalue()
         output.close()
         logger.info(
-            f"Successfully generated serviced clients report. Period: {start_date_filter} to {end_date_filter}. {len(records)} entries.")
+            f"Successfully generated serviced clients report. Period: {start_date_filter} to {end_date_filter}. {records_written} entries.")
         return csv_content
 
     except Exception as e:
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from typing import NamedTuple, TypedDict
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+from src.config import settings
+from src.utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_MAX_RETRIES = 3
+UNREACHABLE_ERROR_MARKERS = (
+    "bot was blocked by the user",
+    "user is deactivated",
+    "chat not found",
+    "user not found",
+)
+
+
+def is_unreachable_error(error: TelegramAPIError) -> bool:
+    return any(marker in error.message for marker in UNREACHABLE_ERROR_MARKERS)
+
+
+class BroadcastContent(NamedTuple):
+    content_type: str
+    text: str | None
+    photo_id: str | None
+
+
+class DeliveryResult(NamedTuple):
+    user_id: int
+    status: str
+    error: str | None
+
+
+class BroadcastProgress(TypedDict):
+    total: int
+    sent: int
+    failed: int
+    pending: int
+    unreachable: int
+    retry_after_pauses: int
+    elapsed_seconds: float
+    rate_per_second: float
+
+
+class BroadcastRun:
+    def __init__(self, total: int, sent: int = 0, failed: int = 0):
+        self.total = total
+        self.sent = sent
+        self.failed = failed
+        self.retry_after_pauses = 0
+        self.unreachable = 0
+        self._done_at_start = sent + failed
+        self.started = time.monotonic()
+
+    def progress(self) -> BroadcastProgress:
+        elapsed = time.monotonic() - self.started
+        done = self.sent + self.failed
+        return BroadcastProgress(
+            total=self.total,
+            sent=self.sent,
+            failed=self.failed,
+            pending=max(0, self.total - done),
+            unreachable=self.unreachable,
+            retry_after_pauses=self.retry_after_pauses,
+            elapsed_seconds=round(elapsed, 1),
+            rate_per_second=round((done - self._done_at_start) / elapsed, 1) if elapsed > 0 else 0.0
+        )
+
+
+class BroadcastEngine:
+    def __init__(self, concurrency: int, rate_per_second: float):
+        self.concurrency = max(1, concurrency)
+        self.limiter = TokenBucket(rate_per_second)
+
+    async def _send(self, bot: Bot, user_id: int, content: BroadcastContent):
+        if content.content_type == 'photo':
+            await bot.send_photo(user_id, content.photo_id, caption=content.text, parse_mode='HTML')
+        else:
+            await bot.send_message(user_id, content.text, parse_mode='HTML', disable_web_page_preview=True)
+
+    async def _deliver(self, bot: Bot, user_id: int, content: BroadcastContent, run: BroadcastRun) -> DeliveryResult:
+        for attempt in range(1, BROADCAST_MAX_RETRIES + 1):
+            await self.limiter.acquire()
+            try:
+                await self._send(bot, user_id, content)
+                logger.debug(f"Broadcast message sent successfully to user {user_id}")
+                return DeliveryResult(user_id, 'sent', None)
+            except TelegramRetryAfter as e:
+                run.retry_after_pauses += 1
+                self.limiter.pause(e.retry_after)
+                logger.warning(
+                    f"Broadcast hit flood control on user {user_id}, pausing all senders for {e.retry_after}s "
+                    f"(attempt {attempt}/{BROADCAST_MAX_RETRIES}).")
+            except TelegramAPIError as e:
+                if is_unreachable_error(e):
+                    logger.warning(f"Broadcast failed for user {user_id} (Blocked/Deactivated/Not Found): {e.message}")
+                    return DeliveryResult(user_id, 'unreachable', e.message)
+                logger.error(f"TelegramAPIError sending broadcast to {user_id}: {e}", exc_info=True)
+                return DeliveryResult(user_id, 'failed', e.message)
+            except Exception as e:
+                logger.error(f"Unexpected error sending broadcast to user {user_id}: {e}", exc_info=True)
+                return DeliveryResult(user_id, 'failed', str(e))
+        logger.error(f"Broadcast to user {user_id} gave up after {BROADCAST_MAX_RETRIES} flood-control retries.")
+        return DeliveryResult(user_id, 'failed', "flood control retries exhausted")
+
+    async def _worker(self, bot: Bot, queue: asyncio.Queue, content: BroadcastContent, run: BroadcastRun,
+                      results: list[DeliveryResult]):
+        while True:
+            try:
+                user_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await self._deliver(bot, user_id, content, run)
+            if result.status == 'sent':
+                run.sent += 1
+            else:
+                run.failed += 1
+                if result.status == 'unreachable':
+                    run.unreachable += 1
+            results.append(result)
+
+    async def deliver_batch(self, bot: Bot, user_ids: list[int], content: BroadcastContent, run: BroadcastRun,
+                            results: list[DeliveryResult]) -> list[DeliveryResult]:
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for user_id in user_ids:
+            queue.put_nowait(user_id)
+        workers = min(self.concurrency, len(user_ids))
+        await asyncio.gather(*(self._worker(bot, queue, content, run, results) for _ in range(workers)))
+        return results
+
+
+broadcast_engine = BroadcastEngine(settings.broadcast_concurrency, settings.broadcast_rate_per_second)
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import NamedTuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from src.config import settings
+from src.database import queries
+from src.database.manager import db_manager
+from src.logic.broadcast import BroadcastContent, BroadcastEngine, BroadcastRun, DeliveryResult, broadcast_engine
+from src.utils.keyboards import get_goto_admin_panel
+from src.utils.messages import get_message
+from src.utils.progress_bar import generate_progress_bar
+
+logger = logging.getLogger(__name__)
+
+JOB_RETRY_DELAY_SECONDS = 5
+RECORD_ATTEMPTS = 3
+RECIPIENT_CURSOR_START = -1
+JOB_TRANSITIONS: dict[str, tuple[str, tuple[str, ...]]] = {
+    'pause': ('paused', ('running',)),
+    'resume': ('running', ('paused',)),
+    'cancel': ('cancelled', ('running', 'paused')),
+}
+
+
+class ProgressMessage(NamedTuple):
+    chat_id: int
+    message_id: int
+
+
+class ProgressReporter:
+    def __init__(self, bot: Bot, job: dict, run: BroadcastRun, engine: BroadcastEngine,
+                 message: ProgressMessage | None, edit_interval_seconds: float):
+        self.bot = bot
+        self.job_id = job['id']
+        self.admin_id = job['admin_id']
+        self.run = run
+        self.engine = engine
+        self.message = message
+        self.edit_interval = edit_interval_seconds
+        self.edits = 0
+        self._text: str | None = None
+        self._edited_at = 0.0
+        self._window = (time.monotonic(), run.sent + run.failed)
+        self._rate = 0.0
+
+    def _sample_rate(self):
+        now = time.monotonic()
+        done = self.run.sent + self.run.failed
+        started, done_before = self._window
+        if now > started:
+            self._rate = (done - done_before) / (now - started)
+        self._window = (now, done)
+
+    def render(self, status: str) -> str:
+        progress = self.run.progress()
+        done = progress['sent'] + progress['failed']
+        percent = min(100, done * 100 // progress['total']) if progress['total'] else 100
+        if status == 'running' and self._rate > 0:
+            eta = str(timedelta(seconds=round(progress['pending'] / self._rate)))
+        else:
+            eta = get_message('admin_panel.broadcast_progress_eta_unknown')
+        return get_message(
+            'admin_panel.broadcast_progress',
+            job_id=self.job_id,
+            status=get_message(f'admin_panel.broadcast_job_status_{status}'),
+            progress_bar=generate_progress_bar(percent),
+            percent=percent,
+            sent=progress['sent'],
+            failed=progress['failed'],
+            pending=progress['pending'],
+            total=progress['total'],
+            rate_per_second=round(self._rate, 1),
+            eta=eta
+        )
+
+    async def publish(self, status: str):
+        text = self.render(status)
+        if text == self._text:
+            return
+        try:
+            if self.message is None:
+                sent = await self.bot.send_message(
+                    chat_id=self.admin_id, text=text, reply_markup=get_goto_admin_panel(), parse_mode='HTML')
+                self.message = ProgressMessage(sent.chat.id, sent.message_id)
+            else:
+                await self.bot.edit_message_text(
+                    text=text,
+                    chat_id=self.message.chat_id,
+                    message_id=self.message.message_id,
+                    reply_markup=get_goto_admin_panel(),
+                    parse_mode='HTML'
+                )
+            self.edits += 1
+            self._text = text
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message:
+                self._text = text
+            elif "message to edit not found" in e.message:
+                logger.warning(f"Progress message of broadcast job {self.job_id} is gone, sending a new one.")
+                self.message = None
+            else:
+                logger.warning(f"Could not update progress of broadcast job {self.job_id}: {e}")
+        except Exception as e:
+            logger.warning(f"Could not update progress of broadcast job {self.job_id}: {e}")
+        finally:
+            self._edited_at = time.monotonic()
+
+    async def report(self, log_interval_seconds: float):
+        while True:
+            await asyncio.sleep(min(log_interval_seconds, self.edit_interval))
+            progress = self.run.progress()
+            logger.info(
+                f"Broadcast job {self.job_id}: {progress['sent'] + progress['failed']}/{progress['total']} "
+                f"({progress['failed']} failed), {progress['rate_per_second']} msg/s.")
+            if time.monotonic() - self._edited_at < self.edit_interval or self.engine.limiter.paused_for > 0:
+                continue
+            self._sample_rate()
+            await self.publish('running')
+
+
+class BroadcastJobRunner:
+    def __init__(self, engine: BroadcastEngine, batch_size: int, report_interval_seconds: float,
+                 progress_edit_interval_seconds: float):
+        self.engine = engine
+        self.batch_size = max(1, batch_size)
+        self.report_interval = report_interval_seconds
+        self.progress_edit_interval = max(1.0, progress_edit_interval_seconds)
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def create_job(self, admin_id: int, content: BroadcastContent, estimated_total: int) -> dict | None:
+        job = await db_manager.execute_returning(
+            queries.CREATE_BROADCAST_JOB, admin_id, content.content_type, content.text, content.photo_id,
+            estimated_total)
+        if job is None:
+            logger.error(f"Could not create broadcast job for admin {admin_id}.")
+            return None
+        logger.info(f"Created broadcast job {job['id']} for ~{job['total']} recipients by admin {admin_id}.")
+        return dict(job)
+
+    async def get_job(self, job_id: int) -> dict | None:
+        job = await db_manager.fetch_one(queries.GET_BROADCAST_JOB, job_id)
+        return dict(job) if job else None
+
+    async def list_jobs(self, limit: int) -> list[dict] | None:
+        jobs = await db_manager.fetch_all(queries.LIST_BROADCAST_JOBS, limit)
+        return [dict(job) for job in jobs] if jobs is not None else None
+
+    def is_active(self, job_id: int) -> bool:
+        task = self._tasks.get(job_id)
+        return task is not None and not task.done()
+
+    def start(self, bot: Bot, job_id: int, progress_message: ProgressMessage | None = None):
+        if self.is_active(job_id):
+            return
+        task = asyncio.create_task(self._run_job(bot, job_id, progress_message))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda done: self._tasks.pop(job_id, None) if self._tasks.get(job_id) is done else None)
+
+    async def set_status(self, bot: Bot, job_id: int, action: str) -> str | None:
+        status, allowed_from = JOB_TRANSITIONS[action]
+        updated = await db_manager.execute_returning(
+            queries.SET_BROADCAST_JOB_STATUS, job_id, status, list(allowed_from))
+        if updated is None:
+            logger.warning(f"Broadcast job {job_id} cannot be moved to {status} ({action}).")
+            return None
+        logger.info(f"Broadcast job {job_id} is now {status}.")
+        if status == 'running':
+            self.start(bot, job_id)
+        return updated['status']
+
+    async def resume_all(self, bot: Bot) -> int:
+        jobs = await db_manager.fetch_all(queries.LIST_RUNNING_BROADCAST_JOBS)
+        if jobs is None:
+            logger.error("Could not load running broadcast jobs to resume.")
+            return 0
+        for job in jobs:
+            await db_manager.execute(queries.RELEASE_BROADCAST_CLAIMS, job['id'])
+            self.start(bot, job['id'])
+        if jobs:
+            logger.info(f"Resumed {len(jobs)} broadcast jobs.")
+        return len(jobs)
+
+    async def _record(self, job_id: int, results: list[DeliveryResult]):
+        if not results:
+            return
+        user_ids = [result.user_id for result in results]
+        statuses = [result.status for result in results]
+        errors = [result.error for result in results]
+        for attempt in range(1, RECORD_ATTEMPTS + 1):
+            recorded = await db_manager.execute_returning(
+                queries.RECORD_BROADCAST_DELIVERIES, job_id, user_ids, statuses, errors)
+            if recorded is not None:
+                return
+            logger.warning(f"Could not record {len(results)} deliveries of broadcast job {job_id} "
+                           f"(attempt {attempt}/{RECORD_ATTEMPTS}).")
+            await asyncio.sleep(JOB_RETRY_DELAY_SECONDS)
+        logger.error(f"Giving up recording {len(results)} deliveries of broadcast job {job_id}; "
+                     f"they will be released and re-sent before the job completes.")
+        await db_manager.execute(queries.RELEASE_BROADCAST_CLAIMS, job_id)
+
+    async def _notify_finished(self, bot: Bot, job: dict, run: BroadcastRun):
+        progress = run.progress()
+        logger.info(
+            f"Broadcast job {job['id']} finished. {progress['sent']}/{progress['total']} sent, "
+            f"{progress['failed']} failed ({progress['unreachable']} now unreachable) in {progress['elapsed_seconds']}s "
+            f"({progress['rate_per_second']} msg/s).")
+        try:
+            await bot.send_message(
+                chat_id=job['admin_id'],
+                text=get_message(
+                    'admin_panel.broadcast_success',
+                    success_count=progress['sent'],
+                    fail_count=progress['failed'],
+                    total_users=progress['total'],
+                    elapsed_seconds=progress['elapsed_seconds'],
+                    rate_per_second=progress['rate_per_second']
+                ),
+                reply_markup=get_goto_admin_panel()
+            )
+        except Exception as e:
+            logger.error(f"Failed to notify admin {job['admin_id']} about broadcast job {job['id']}: {e}", exc_info=True)
+
+    async def _claim(self, job_id: int, cursor: int | None) -> tuple[list[int], int | None] | None:
+        if cursor is not None:
+            page = await db_manager.execute_returning(
+                queries.CLAIM_BROADCAST_DELIVERIES, job_id, self.batch_size, cursor)
+            if page is None:
+                return None
+            return list(page['user_ids']), page['next_cursor']
+        released = await db_manager.execute(queries.RELEASE_BROADCAST_CLAIMS, job_id)
+        if released is None:
+            return None
+        if released != 'UPDATE 0':
+            logger.warning(f"Broadcast job {job_id} had unrecorded claims ({released}), sending them again.")
+        claimed = await db_manager.fetch_all(
+            queries.CLAIM_RELEASED_BROADCAST_DELIVERIES, job_id, self.batch_size, retry=False)
+        if claimed is None:
+            return None
+        return [row['user_id'] for row in claimed], None
+
+    async def _run_batch(self, bot: Bot, job_id: int, content: BroadcastContent, run: BroadcastRun,
+                         cursor: int | None) -> tuple[bool, int | None]:
+        job = await self.get_job(job_id)
+        if job is None:
+            logger.warning(f"Broadcast job {job_id} could not be read, retrying in {JOB_RETRY_DELAY_SECONDS}s.")
+            await asyncio.sleep(JOB_RETRY_DELAY_SECONDS)
+            return True, cursor
+        if job['status'] != 'running':
+            logger.info(f"Broadcast job {job_id} stopped: {job['status']}.")
+            return False, cursor
+
+        claimed = await self._claim(job_id, cursor)
+        if claimed is None:
+            await asyncio.sleep(JOB_RETRY_DELAY_SECONDS)
+            return True, cursor
+        user_ids, next_cursor = claimed
+        if not user_ids:
+            if cursor is not None:
+                return True, next_cursor
+            completed = await db_manager.execute_returning(
+                queries.SET_BROADCAST_JOB_STATUS, job_id, 'completed', ['running'])
+            if completed:
+                run.total = completed['total']
+                await self._notify_finished(bot, job, run)
+            return False, None
+
+        results: list[DeliveryResult] = []
+        try:
+            await self.engine.deliver_batch(bot, user_ids, content, run, results)
+        except asyncio.CancelledError:
+            await self._record(job_id, results)
+            raise
+        await self._record(job_id, results)
+        return True, next_cursor
+
+    async def _run_job(self, bot: Bot, job_id: int, progress_message: ProgressMessage | None):
+        job = await self.get_job(job_id)
+        if job is None:
+            logger.error(f"Broadcast job {job_id} not found, not starting it.")
+            return
+        content = BroadcastContent(job['content_type'], job['text'], job['photo_id'])
+        run = BroadcastRun(job['total'], job['sent'], job['failed'])
+        logger.info(f"Broadcast job {job_id} running: {job['sent'] + job['failed']}/{job['total']} already done.")
+
+        progress = ProgressReporter(bot, job, run, self.engine, progress_message, self.progress_edit_interval)
+        reporter = asyncio.create_task(progress.report(self.report_interval))
+        try:
+            cursor: int | None = RECIPIENT_CURSOR_START
+            while True:
+                try:
+                    running, cursor = await self._run_batch(bot, job_id, content, run, cursor)
+                    if not running:
+                        reporter.cancel()
+                        final = await self.get_job(job_id)
+                        if final is not None:
+                            await progress.publish(final['status'])
+                        return
+                except asyncio.CancelledError:
+                    logger.info(f"Broadcast job {job_id} interrupted, it will resume on the next start.")
+                    raise
+                except Exception as e:
+                    logger.error(f"Broadcast job {job_id} batch failed, retrying in {JOB_RETRY_DELAY_SECONDS}s: {e}",
+                                 exc_info=True)
+                    await asyncio.sleep(JOB_RETRY_DELAY_SECONDS)
+        finally:
+            reporter.cancel()
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+broadcast_jobs = BroadcastJobRunner(
+    broadcast_engine, settings.broadcast_batch_size, settings.broadcast_report_interval_seconds,
+    settings.broadcast_progress_edit_interval_seconds)
@@ -0,0 +1,255 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timezone
+from typing import TypedDict
+
+from aiogram import Bot
+
+from src.config import settings
+from src.database import queries
+from src.database.manager import db_manager
+from src.logic.code_messages import code_message_writer
+from src.logic.token_cache import token_cache
+from src.utils.qr_generator import qr_photo_cache
+from src.utils.rate_limiter import TokenBucket
+from src.utils.tg_utils import safe_delete_message
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_RETRY_DELAY_SECONDS = 5
+
+
+class CleanupRunStats(TypedDict):
+    rows: int
+    batches: int
+    api_calls: int
+    api_failures: int
+    duration_ms: float
+
+
+class CodeExpiryStats(TypedDict):
+    expiry_scheduled: int
+    expiry_next_in_seconds: float | None
+    expiry_expired: int
+    expiry_batches: int
+    expiry_failures: int
+    expiry_skipped: int
+    expiry_lag_avg_ms: float
+    expiry_lag_max_ms: float
+    sweep_rows: int
+    sweep_batches: int
+    sweep_api_calls: int
+    sweep_api_failures: int
+    sweep_duration_ms: float
+
+
+class CodeExpiryScheduler:
+    def __init__(self, batch_size: int, batch_interval_ms: int, sweep_batch_size: int,
+                 delete_rate_per_second: float, delete_concurrency: int):
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval_ms / 1000
+        self.sweep_batch_size = max(1, sweep_batch_size)
+        self.delete_limiter = TokenBucket(delete_rate_per_second)
+        self._delete_slots = asyncio.Semaphore(max(1, delete_concurrency))
+        self.last_sweep = CleanupRunStats(rows=0, batches=0, api_calls=0, api_failures=0, duration_ms=0.0)
+        self._heap: list[tuple[datetime, str, int]] = []
+        self._live: dict[str, datetime] = {}
+        self._changed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.expired = 0
+        self.batches = 0
+        self.failures = 0
+        self.skipped = 0
+        self._lag_samples = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+
+    def schedule(self, secret_code: str, user_id: int, expires_at: datetime):
+        self._live[secret_code] = expires_at
+        heapq.heappush(self._heap, (expires_at, secret_code, user_id))
+        if self._heap[0][1] == secret_code:
+            self._changed.set()
+
+    def discard(self, secret_code: str):
+        self._live.pop(secret_code, None)
+
+    async def load(self) -> int:
+        rows = await db_manager.fetch_all(queries.LIST_CODE_EXPIRIES)
+        if rows is None:
+            logger.error("Could not load temporary code expiries, relying on the cleanup sweep.")
+            return 0
+        for row in rows:
+            self._live[row['secret_code']] = row['expires_at']
+            self._heap.append((row['expires_at'], row['secret_code'], row['user_id']))
+        heapq.heapify(self._heap)
+        self._changed.set()
+        logger.info(f"Code expiry scheduler loaded {len(rows)} temporary codes.")
+        return len(rows)
+
+    async def _delete_message(self, bot: Bot, record) -> bool | None:
+        secret_code, user_id = record['secret_code'], record['user_id']
+        self.discard(secret_code)
+        qr_photo_cache.discard(secret_code)
+        token_cache.discard(secret_code)
+        message_id = code_message_writer.take(secret_code, user_id) or record['message_id']
+        if not message_id or not record['is_reachable']:
+            return None
+        async with self._delete_slots:
+            await self.delete_limiter.acquire()
+            return await safe_delete_message(bot, chat_id=user_id, message_id=message_id)
+
+    async def delete_messages(self, bot: Bot, records) -> tuple[int, int]:
+        results = await asyncio.gather(*(self._delete_message(bot, record) for record in records))
+        calls = sum(1 for result in results if result is not None)
+        failures = sum(1 for result in results if result is False)
+        return calls, failures
+
+    async def sweep(self, bot: Bot) -> CleanupRunStats:
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        rows = batches = api_calls = api_failures = 0
+
+        while True:
+            deleted_records = await db_manager.fetch_all(
+                queries.DELETE_EXPIRED_CODES, now, self.sweep_batch_size, retry=False)
+            if deleted_records is None:
+                logger.error("Cleanup: Database error during expired code deletion, stopping this run.")
+                break
+            if not deleted_records:
+                break
+            batches += 1
+            rows += len(deleted_records)
+            calls, failures = await self.delete_messages(bot, deleted_records)
+            api_calls += calls
+            api_failures += failures
+            if len(deleted_records) < self.sweep_batch_size:
+                break
+
+        self.last_sweep = CleanupRunStats(
+            rows=rows,
+            batches=batches,
+            api_calls=api_calls,
+            api_failures=api_failures,
+            duration_ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+        if rows:
+            logger.info(
+                f"Cleanup finished: {rows} expired codes in {batches} batches, "
+                f"{api_calls} TG deletions ({api_failures} failed) in {self.last_sweep['duration_ms']} ms.")
+        else:
+            logger.info("Cleanup: No expired codes found to delete.")
+        return self.last_sweep
+
+    def _pop_due(self, now: datetime) -> list[tuple[datetime, str, int]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            entry = heapq.heappop(self._heap)
+            expires_at, secret_code, _ = entry
+            if self._live.get(secret_code) != expires_at:
+                self.skipped += 1
+                continue
+            del self._live[secret_code]
+            due.append(entry)
+        return due
+
+    async def expire_due(self, bot: Bot) -> int:
+        now = datetime.now(timezone.utc)
+        due = self._pop_due(now)
+        if not due:
+            return 0
+
+        deleted_records = await db_manager.fetch_all(
+            queries.EXPIRE_CODES, [entry[1] for entry in due], [entry[2] for entry in due], now, retry=False)
+        if deleted_records is None:
+            self.failures += 1
+            for entry in due:
+                self._live.setdefault(entry[1], entry[0])
+                heapq.heappush(self._heap, entry)
+            logger.warning(f"Could not expire {len(due)} temporary codes, retrying in {EXPIRY_RETRY_DELAY_SECONDS}s.")
+            await asyncio.sleep(EXPIRY_RETRY_DELAY_SECONDS)
+            return 0
+
+        self.batches += 1
+        for expires_at, _, _ in due:
+            lag = (now - expires_at).total_seconds()
+            self._lag_samples += 1
+            self._lag_total += lag
+            self._lag_max = max(self._lag_max, lag)
+
+        await self.delete_messages(bot, deleted_records)
+        self.expired += len(deleted_records)
+        if deleted_records:
+            logger.info(f"Expired {len(deleted_records)} temporary codes ({len(due)} due).")
+        return len(deleted_records)
+
+    async def _run(self, bot: Bot):
+        while True:
+            self._changed.clear()
+            if not self._heap:
+                await self._changed.wait()
+                continue
+
+            delay = (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.expire_due(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Code expiry batch failed: {e}", exc_info=True)
+                await asyncio.sleep(EXPIRY_RETRY_DELAY_SECONDS)
+            await asyncio.sleep(self.batch_interval)
+
+    async def start(self, bot: Bot):
+        if self._task is not None:
+            return
+        await self.load()
+        self._task = asyncio.create_task(self._run(bot))
+        logger.info(
+            f"Code expiry scheduler started ({self.batch_size} codes per batch, "
+            f"{self.batch_interval * 1000:.0f} ms between batches).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            logger.info("Code expiry scheduler successfully cancelled.")
+        self._task = None
+        self._heap.clear()
+        self._live.clear()
+
+    def stats(self) -> CodeExpiryStats:
+        next_in = None
+        if self._heap:
+            next_in = round((self._heap[0][0] - datetime.now(timezone.utc)).total_seconds(), 1)
+        return CodeExpiryStats(
+            expiry_scheduled=len(self._live),
+            expiry_next_in_seconds=next_in,
+            expiry_expired=self.expired,
+            expiry_batches=self.batches,
+            expiry_failures=self.failures,
+            expiry_skipped=self.skipped,
+            expiry_lag_avg_ms=round(self._lag_total / self._lag_samples * 1000, 1) if self._lag_samples else 0.0,
+            expiry_lag_max_ms=round(self._lag_max * 1000, 1),
+            sweep_rows=self.last_sweep['rows'],
+            sweep_batches=self.last_sweep['batches'],
+            sweep_api_calls=self.last_sweep['api_calls'],
+            sweep_api_failures=self.last_sweep['api_failures'],
+            sweep_duration_ms=self.last_sweep['duration_ms']
+        )
+
+
+code_expiry = CodeExpiryScheduler(
+    settings.expiry_batch_size, settings.expiry_batch_interval_ms, settings.cleanup_batch_size,
+    settings.message_delete_rate_per_second, settings.message_delete_concurrency)
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import TypedDict
+
+from src.config import settings
+from src.database import queries
+from src.database.manager import db_manager
+
+logger = logging.getLogger(__name__)
+
+
+class CodeMessageWriterStats(TypedDict):
+    message_ids_pending: int
+    message_ids_flushed: int
+    message_id_flushes: int
+    message_id_flush_failures: int
+
+
+class CodeMessageWriter:
+    def __init__(self, flush_interval_ms: int, batch_size: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self._pending: dict[tuple[str, int], int] = {}
+        self._in_flight: list[dict[tuple[str, int], int]] = []
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def put(self, secret_code: str, user_id: int, message_id: int):
+        self._pending[(secret_code, user_id)] = message_id
+        self._has_pending.set()
+        if len(self._pending) >= self.batch_size:
+            self._batch_full.set()
+
+    def take(self, secret_code: str, user_id: int) -> int | None:
+        key = (secret_code, user_id)
+        message_id = self._pending.pop(key, None)
+        for batch in self._in_flight:
+            message_id = batch.pop(key, None) or message_id
+        return message_id
+
+    async def flush(self) -> int:
+        self._has_pending.clear()
+        self._batch_full.clear()
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        secret_codes, user_ids, message_ids = [], [], []
+        for (secret_code, user_id), message_id in batch.items():
+            secret_codes.append(secret_code)
+            user_ids.append(user_id)
+            message_ids.append(message_id)
+
+        self._in_flight.append(batch)
+        try:
+            result = await db_manager.execute(queries.SET_CODE_MESSAGE_IDS, secret_codes, user_ids, message_ids)
+        finally:
+            self._in_flight = [in_flight for in_flight in self._in_flight if in_flight is not batch]
+        if result is None:
+            self.failures += 1
+            for key, message_id in batch.items():
+                self._pending.setdefault(key, message_id)
+            self._has_pending.set()
+            logger.warning(f"Could not flush {len(batch)} QR message ids, keeping them for the next flush.")
+            return 0
+
+        self.flushes += 1
+        self.flushed += len(secret_codes)
+        logger.info(f"Flushed {len(secret_codes)} QR message ids ({result}).")
+        return len(secret_codes)
+
+    async def _run(self):
+        while True:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"QR message id flush failed: {e}", exc_info=True)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"QR message id writer started (every {self.flush_interval * 1000:.0f} ms "
+                f"or {self.batch_size} ids).")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                logger.info("QR message id writer successfully cancelled.")
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> CodeMessageWriterStats:
+        return CodeMessageWriterStats(
+            message_ids_pending=len(self._pending) + sum(len(batch) for batch in self._in_flight),
+            message_ids_flushed=self.flushed,
+            message_id_flushes=self.flushes,
+            message_id_flush_failures=self.failures
+        )
+
+
+code_message_writer = CodeMessageWriter(settings.qr_message_id_flush_interval_ms, settings.qr_message_id_flush_batch)
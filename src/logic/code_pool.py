@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from collections import deque
+from typing import NamedTuple, TypedDict
+
+from src.config import settings
+from src.logic.qr_logic import new_secret_code
+from src.utils.qr_generator import qr_render_pool
+
+logger = logging.getLogger(__name__)
+
+REFILL_RETRY_DELAY_SECONDS = 5
+
+
+class PregeneratedCode(NamedTuple):
+    secret_code: str
+    png: bytes
+
+
+class CodePoolStats(TypedDict):
+    pool_available: int
+    pool_low_watermark: int
+    pool_high_watermark: int
+    pool_refill_rate: float
+    pool_produced: int
+    pool_served: int
+    pool_misses: int
+
+
+class CodePool:
+    def __init__(self, low_watermark: int, high_watermark: int, refill_rate: float):
+        self.high_watermark = max(0, high_watermark)
+        self.low_watermark = min(max(0, low_watermark), self.high_watermark)
+        self.refill_rate = refill_rate
+        self._codes: deque[PregeneratedCode] = deque()
+        self._refill_needed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.produced = 0
+        self.served = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.high_watermark > 0
+
+    def take(self) -> PregeneratedCode | None:
+        if not self.enabled:
+            return None
+        code = self._codes.popleft() if self._codes else None
+        if code is None:
+            self.misses += 1
+        else:
+            self.served += 1
+        if len(self._codes) <= self.low_watermark:
+            self._refill_needed.set()
+        return code
+
+    def put_back(self, code: PregeneratedCode):
+        if self.enabled and len(self._codes) < self.high_watermark:
+            self._codes.appendleft(code)
+            self.served -= 1
+
+    async def _refill(self):
+        while len(self._codes) < self.high_watermark:
+            secret_code = new_secret_code()
+            png = await qr_render_pool.render(secret_code)
+            self._codes.append(PregeneratedCode(secret_code, png))
+            self.produced += 1
+            if self.refill_rate > 0:
+                await asyncio.sleep(1 / self.refill_rate)
+
+    async def _run(self):
+        self._refill_needed.set()
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+            try:
+                started_with = len(self._codes)
+                await self._refill()
+                logger.info(f"Code pool refilled from {started_with} to {len(self._codes)} pre-rendered codes.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Code pool refill failed, retrying in {REFILL_RETRY_DELAY_SECONDS}s: {e}", exc_info=True)
+                await asyncio.sleep(REFILL_RETRY_DELAY_SECONDS)
+                self._refill_needed.set()
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Code pool producer started (low {self.low_watermark}, high {self.high_watermark}, "
+            f"{self.refill_rate}/s).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            logger.info("Code pool producer successfully cancelled.")
+        self._task = None
+        self._codes.clear()
+
+    def stats(self) -> CodePoolStats:
+        return CodePoolStats(
+            pool_available=len(self._codes),
+            pool_low_watermark=self.low_watermark,
+            pool_high_watermark=self.high_watermark,
+            pool_refill_rate=self.refill_rate,
+            pool_produced=self.produced,
+            pool_served=self.served,
+            pool_misses=self.misses
+        )
+
+
+code_pool = CodePool(settings.qr_pool_low_watermark, settings.qr_pool_high_watermark, settings.qr_pool_refill_rate)
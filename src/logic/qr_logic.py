@@ -1,35 +1,85 @@
 import logging
 import secrets
 from datetime import datetime, timedelta, timezone
+from typing import TypedDict
 
+from src.database import queries
 from src.database.manager import db_manager
+from src.database.unit_of_work import UnitOfWork
+from src.logic.code_expiry import code_expiry
+from src.logic.code_messages import code_message_writer
+from src.logic.token_cache import token_cache
 from src.config import settings
 
 logger = logging.getLogger(__name__)
 
-async def generate_and_store_temporary_code(user_id: int) -> str | None:
-    try:
-        secret_code = secrets.token_hex(3).upper()
+CODE_ISSUE_ATTEMPTS = 5
+QR_REUSE_POLICIES = ('reuse', 'extend', 'rotate')
+
+
+class IssuedCode(TypedDict):
+    secret_code: str
+    ttl_seconds: int
+    reused: bool
+    stale_message_ids: list[int]
+
+def new_secret_code() -> str:
+    return secrets.token_hex(3).upper()
+
+def _reuse_parameters(policy: str) -> tuple[float | None, bool]:
+    if policy == 'rotate':
+        return None, False
+    if policy == 'extend':
+        return 0.0, True
+    return float(settings.qr_reuse_min_ttl_seconds), False
+
+async def issue_temporary_code(user_id: int, uow: UnitOfWork | None = None,
+                               secret_code: str | None = None) -> IssuedCode | None:
+    policy = settings.qr_reuse_policy if settings.qr_reuse_policy in QR_REUSE_POLICIES else 'reuse'
+    reuse_min_ttl, extend = _reuse_parameters(policy)
+
+    for attempt in range(1, CODE_ISSUE_ATTEMPTS + 1):
+        secret_code = secret_code or new_secret_code()
         now = datetime.now(timezone.utc)
         expires_at = now + timedelta(seconds=settings.qr_code_ttl_seconds)
-        logger.info(f"Generated temporary code {secret_code} for user {user_id} with expiration at {expires_at}")
-    except Exception as e:
-        logger.error(f"Error generating and storing temporary code for user {user_id}: {e}", exc_info=True)
-        return None
-
-    sql_insert_code = """
-    INSERT INTO temporary_codes (user_id, secret_code, expires_at)
-    VALUES ($1, $2, $3);
-    """
-    try:
-        insert_result = await db_manager.execute(sql_insert_code, user_id, secret_code, expires_at)
-
-        if insert_result and 'INSERT 0 1' in insert_result:
-            logger.info(f"Successfully stored temporary code {secret_code} for user {user_id}.")
-            return secret_code
+
+        try:
+            issued = await (uow or db_manager).execute_returning(
+                queries.ISSUE_CODE, user_id, secret_code, now, expires_at, reuse_min_ttl, extend)
+        except Exception as e:
+            logger.error(f"Error issuing temporary code for user {user_id}: {e}", exc_info=True)
+            return None
+
+        if issued is None:
+            logger.error(f"Could not issue temporary code for user {user_id}.")
+            return None
+        if issued['secret_code'] is None:
+            logger.warning(
+                f"Temporary code {secret_code} collided with an existing code or a concurrent tap "
+                f"(attempt {attempt}/{CODE_ISSUE_ATTEMPTS}), generating a new one.")
+            secret_code = None
+            continue
+
+        stale_message_ids = []
+        for stale_code, message_id in zip(issued['stale_codes'], issued['stale_message_ids']):
+            if stale_code != issued['secret_code']:
+                token_cache.discard(stale_code)
+                code_expiry.discard(stale_code)
+            message_id = code_message_writer.take(stale_code, user_id) or message_id
+            if message_id:
+                stale_message_ids.append(message_id)
+
+        if not issued['reused'] or extend:
+            code_expiry.schedule(issued['secret_code'], user_id, issued['expires_at'])
+        token_cache.put(issued['secret_code'], user_id, issued['expires_at'])
+
+        ttl_seconds = max(0, int((issued['expires_at'] - now).total_seconds()))
+        if issued['reused']:
+            logger.info(f"Reusing live temporary code {issued['secret_code']} for user {user_id} ({ttl_seconds}s left).")
         else:
-             logger.error(f"Could not store temporary code {secret_code} for user {user_id}.")
-             return None
-    except Exception as e:
-        logger.error(f"Error storing temporary code {secret_code} for user {user_id}: {e}", exc_info=True)
-        return None
\ No newline at end of file
+            logger.info(f"Issued temporary code {issued['secret_code']} for user {user_id} expiring at {expires_at}.")
+        return IssuedCode(secret_code=issued['secret_code'], ttl_seconds=ttl_seconds, reused=issued['reused'],
+                          stale_message_ids=stale_message_ids)
+
+    logger.error(f"Could not issue a unique temporary code for user {user_id} after {CODE_ISSUE_ATTEMPTS} attempts.")
+    return None
@@ -1,17 +1,12 @@
 import logging
+from src.database import queries
 from src.database.manager import db_manager
 
 logger = logging.getLogger(__name__)
 
 async def save_user_name(user_id: int, user_name: str) -> bool:
-    sql_upsert_name = """
-    INSERT INTO users (user_id, name)
-    VALUES ($1, $2)
-    ON CONFLICT (user_id) DO UPDATE SET
-        name = EXCLUDED.name;
-    """
     try:
-        result = await db_manager.execute(sql_upsert_name, user_id, user_name)
+        result = await db_manager.execute(queries.SAVE_USER_NAME, user_id, user_name)
         if result is not None:
             logger.info(f"User name {user_id} saved in DB.")
             return True
@@ -23,12 +18,8 @@ async def save_user_name(user_id: int, user_name: str) -> bool:
         return False
 
 async def save_user_phone(user_id: int, phone_number: str) -> bool:
-    sql_update_phone = """
-    UPDATE users SET phone_number = $1
-    WHERE user_id = $2;
-    """
     try:
-        result = await db_manager.execute(sql_update_phone, phone_number, user_id)
+        result = await db_manager.execute(queries.SAVE_USER_PHONE, phone_number, user_id)
         if result and 'UPDATE 1' in result:
             logger.info(f"Phone number {phone_number} updated for user {user_id}.")
             return True
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, TypedDict
+
+from src.config import settings
+
+
+class CachedToken(NamedTuple):
+    user_id: int
+    expires_at: datetime
+
+
+class TokenCacheStats(TypedDict):
+    token_cache_size: int
+    token_cache_max_entries: int
+    token_cache_hits: int
+    token_cache_misses: int
+
+
+class TokenCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max(0, max_entries)
+        self._entries: OrderedDict[str, CachedToken] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, secret_code: str, now: datetime) -> CachedToken | None:
+        entry = self._entries.get(secret_code)
+        if entry is None or entry.expires_at <= now:
+            self._entries.pop(secret_code, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, secret_code: str, user_id: int, expires_at: datetime):
+        if not self.max_entries:
+            return
+        self._entries[secret_code] = CachedToken(user_id, expires_at)
+        self._entries.move_to_end(secret_code)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, secret_code: str):
+        self._entries.pop(secret_code, None)
+
+    def stats(self) -> TokenCacheStats:
+        return TokenCacheStats(
+            token_cache_size=len(self._entries),
+            token_cache_max_entries=self.max_entries,
+            token_cache_hits=self.hits,
+            token_cache_misses=self.misses
+        )
+
+
+token_cache = TokenCache(settings.token_cache_max_entries)
@@ -90,6 +90,12 @@ def get_admin_panel_keyboard(user_id: int) -> InlineKeyboardMarkup:
                 callback_data="admin:start_broadcast"
             )
         )
+        builder.row(
+            InlineKeyboardButton(
+                text=get_message('admin_panel.broadcast_jobs_button'),
+                callback_data="admin:broadcast_jobs"
+            )
+        )
         builder.row(
             InlineKeyboardButton(
                 text=get_message('admin_panel.waiters_report_button'),
@@ -102,7 +108,7 @@ def get_admin_panel_keyboard(user_id: int) -> InlineKeyboardMarkup:
                 callback_data="admin:serviced_clients_report"
             )
         )
-        builder.adjust(1,2,2)
+        builder.adjust(1,2,1,2)
     return builder.as_markup()
 
 def get_broadcast_confirmation_keyboard() -> InlineKeyboardMarkup:
@@ -119,6 +125,42 @@ def get_broadcast_confirmation_keyboard() -> InlineKeyboardMarkup:
     )
     return builder.as_markup()
 
+def get_broadcast_jobs_keyboard(jobs: list[dict]) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for job in jobs:
+        builder.row(
+            InlineKeyboardButton(
+                text=get_message('admin_panel.broadcast_job_button', job_id=job['id'],
+                                 status=get_message(f"admin_panel.broadcast_job_status_{job['status']}")),
+                callback_data=f"broadcast_job:view:{job['id']}"
+            )
+        )
+    builder.row(
+        InlineKeyboardButton(
+            text=get_message('admin_panel.goto_panel'),
+            callback_data="admin:back_to_panel"
+        )
+    )
+    return builder.as_markup()
+
+def get_broadcast_job_keyboard(job_id: int, status: str) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    if status == 'running':
+        builder.button(text=get_message('admin_panel.broadcast_job_pause_button'),
+                       callback_data=f"broadcast_job:pause:{job_id}")
+    if status == 'paused':
+        builder.button(text=get_message('admin_panel.broadcast_job_resume_button'),
+                       callback_data=f"broadcast_job:resume:{job_id}")
+    if status in ('running', 'paused'):
+        builder.button(text=get_message('admin_panel.broadcast_job_cancel_button'),
+                       callback_data=f"broadcast_job:cancel:{job_id}")
+    builder.button(text=get_message('admin_panel.broadcast_job_refresh_button'),
+                   callback_data=f"broadcast_job:view:{job_id}")
+    builder.button(text=get_message('admin_panel.broadcast_jobs_back_button'),
+                   callback_data="admin:broadcast_jobs")
+    builder.adjust(2)
+    return builder.as_markup()
+
 def get_goto_admin_panel() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(
@@ -1,25 +1,201 @@
+import asyncio
 import qrcode
 import io
 import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict
+
 from aiogram.types import InputFile, BufferedInputFile
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
+
+from src.config import settings
 
 logger = logging.getLogger(__name__)
 
-async def generate_qr_code_inputfile(data: str) -> InputFile | None:
-    logger.info(f"Generating QR code for data: {data}")
-    try:
-        img = qrcode.make(data)
+ERROR_CORRECTION_LEVELS = {
+    'L': ERROR_CORRECT_L,
+    'M': ERROR_CORRECT_M,
+    'Q': ERROR_CORRECT_Q,
+    'H': ERROR_CORRECT_H,
+}
+
+
+class QrRenderStats(TypedDict):
+    encoder: str
+    workers: int
+    queue_limit: int
+    queued: int
+    in_flight: int
+    rendered: int
+    failed: int
+    render_avg_ms: float
+    render_max_ms: float
+    wait_avg_ms: float
+    wait_max_ms: float
+    bytes_avg: int
+    bytes_last: int
+
+
+class QrEncoder:
+    def __init__(self, mode: str, error_correction: str, box_size: int, border: int):
+        if error_correction not in ERROR_CORRECTION_LEVELS:
+            logger.warning(f"Unknown QR error correction level '{error_correction}', falling back to L.")
+            error_correction = 'L'
+        self.mode = mode if mode in ('compact', 'legacy') else 'compact'
+        self.error_correction = error_correction
+        self.box_size = max(1, box_size)
+        self.border = max(0, border)
 
+    def describe(self) -> str:
+        if self.mode == 'legacy':
+            return 'legacy'
+        return f"compact (EC {self.error_correction}, box {self.box_size}px, border {self.border})"
+
+    def encode(self, data: str) -> bytes:
         buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
-        buffer.seek(0)
+        if self.mode == 'legacy':
+            qrcode.make(data).save(buffer, format="PNG")
+            return buffer.getvalue()
+
+        qr = qrcode.QRCode(
+            version=None,
+            error_correction=ERROR_CORRECTION_LEVELS[self.error_correction],
+            box_size=self.box_size,
+            border=self.border
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+        qr.make_image().save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+
+class QrRenderPool:
+    def __init__(self, encoder: QrEncoder, workers: int, queue_size: int):
+        self.encoder = encoder
+        self.workers = max(1, workers)
+        self.queue_limit = max(self.workers, queue_size)
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.total_render = 0.0
+        self.max_render = 0.0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_bytes = 0
+        self.last_bytes = 0
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='qr-render')
+            self._slots = asyncio.Semaphore(self.queue_limit)
+
+    def _render(self, data: str, submitted_at: float) -> tuple[bytes, float, float]:
+        started = time.perf_counter()
+        png = self.encoder.encode(data)
+        return png, started - submitted_at, time.perf_counter() - started
+
+    async def render(self, data: str) -> bytes:
+        self._ensure_started()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            png, waited, rendered_in = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._render, data, time.perf_counter())
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+        self.rendered += 1
+        self.total_render += rendered_in
+        self.max_render = max(self.max_render, rendered_in)
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.total_bytes += len(png)
+        self.last_bytes = len(png)
+        return png
 
-        qr_photo = BufferedInputFile(
-            file=buffer.getvalue(),
-            filename="generated_qr_code.png"
+    def stats(self) -> QrRenderStats:
+        rendered = self.rendered or 1
+        return QrRenderStats(
+            encoder=self.encoder.describe(),
+            workers=self.workers,
+            queue_limit=self.queue_limit,
+            queued=self.waiting + max(0, self.in_flight - self.workers),
+            in_flight=self.in_flight,
+            rendered=self.rendered,
+            failed=self.failed,
+            render_avg_ms=round(self.total_render / rendered * 1000, 2),
+            render_max_ms=round(self.max_render * 1000, 2),
+            wait_avg_ms=round(self.total_wait / rendered * 1000, 2),
+            wait_max_ms=round(self.max_wait * 1000, 2),
+            bytes_avg=self.total_bytes // rendered,
+            bytes_last=self.last_bytes
         )
-        logger.info(f"Successfully generated QR code InputFile for data: {data}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+
+
+class QrPhotoCache:
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, secret_code: str) -> str | None:
+        entry = self._entries.get(secret_code)
+        if entry is None or entry[1] <= time.monotonic():
+            self._entries.pop(secret_code, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def put(self, secret_code: str, file_id: str, ttl_seconds: float):
+        self._entries[secret_code] = (file_id, time.monotonic() + ttl_seconds)
+        self._entries.move_to_end(secret_code)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, secret_code: str):
+        self._entries.pop(secret_code, None)
+
+
+qr_encoder = QrEncoder(settings.qr_encoder, settings.qr_error_correction, settings.qr_box_size, settings.qr_border)
+qr_render_pool = QrRenderPool(qr_encoder, settings.qr_render_workers, settings.qr_render_queue_size)
+qr_photo_cache = QrPhotoCache()
+
+
+def build_qr_inputfile(png: bytes) -> InputFile:
+    return BufferedInputFile(
+        file=png,
+        filename="generated_qr_code.png"
+    )
+
+
+async def generate_qr_code_inputfile(data: str) -> InputFile | None:
+    logger.info(f"Generating QR code for data: {data}")
+    try:
+        png = await qr_render_pool.render(data)
+
+        qr_photo = build_qr_inputfile(png)
+        logger.info(f"Successfully generated QR code InputFile for data: {data} ({len(png)} bytes)")
         return qr_photo
     except Exception as e:
         logger.error(f"Failed to generate QR code for data '{data}': {e}", exc_info=True)
-        return None
\ No newline at end of file
+        return None
@@ -7,11 +7,12 @@ logger = logging.getLogger(__name__)
 
 ERROR_MSG_DELETE_DELAY = 7
 
-async def safe_delete_message(bot: Bot, chat_id: int, message_id: int | None):
+async def safe_delete_message(bot: Bot, chat_id: int, message_id: int | None) -> bool:
     if message_id is None:
-        return
+        return False
     try:
         await bot.delete_message(chat_id=chat_id, message_id=message_id)
+        return True
     except TelegramAPIError as e:
         if "message to delete not found" in e.message or \
            "message can't be deleted" in e.message:
@@ -20,6 +21,7 @@ async def safe_delete_message(bot: Bot, chat_id: int, message_id: int | None):
              logger.error(f"Error deleting message {message_id} in chat {chat_id}: {e}", exc_info=True)
     except Exception as e:
          logger.error(f"Unexpected error deleting message {message_id} in chat {chat_id}: {e}", exc_info=True)
+    return False
 
 
 async def send_temporary_error(bot: Bot, chat_id: int, user_message_id: int | None, error_text: str, delay: int = ERROR_MSG_DELETE_DELAY):